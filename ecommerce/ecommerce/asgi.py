@@ -3,6 +3,37 @@ ASGI config for ecommerce project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Deployment profile (uvicorn)::
+
+    pip install "uvicorn[standard]" redis
+    DJANGO_REDIS_URL=redis://127.0.0.1:6379/0 \
+    DJANGO_DB_ENGINE=postgresql DJANGO_DB_POOL_SIZE=10 \
+        uvicorn ecommerce.asgi:application --workers 4 --lifespan off
+
+- Run one worker per core. Each worker serves the async views (cart
+  clicks, the cart API and product detail) on its event loop, so a click
+  waiting on the cache or database does not occupy a thread. Sync views
+  still run, each in a thread from the worker's pool.
+- Workers must share the cart and catalog caches, so set DJANGO_REDIS_URL
+  (or DJANGO_CACHE_DIR on a single host without Redis); see CACHES in
+  settings.py.
+- Use the connection pool (DJANGO_DB_POOL_SIZE) or DJANGO_DB_CONN_MAX_AGE=0
+  with PostgreSQL: persistent connections are per-thread and not reused by
+  async requests.
+- Serve static and media files from the front proxy, as under WSGI.
+- /events/stock/ streams live stock to catalog and product pages. Each
+  stream is a coroutine, not a thread, and ends after
+  STOCK_EVENTS_STREAM_SECONDS; the proxy must not buffer it (the view sets
+  X-Accel-Buffering: no) and its read timeout must exceed
+  STOCK_EVENTS_KEEPALIVE. Stock changes are published in-process: a
+  stream sees sales made through its own worker as they happen, and those
+  made through other workers from the database snapshot that starts every
+  stream. Under WSGI the endpoint answers 204 and pages keep the stock
+  they were rendered with.
+
+`manage.py bench_cart_concurrency` compares the cart endpoints under both
+handlers in-process.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -41,11 +44,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'main.middleware.StaticFilesMiddleware',
+    'main.middleware.QueryProfileMiddleware',
+    'main.middleware.ReadYourWritesMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'main.middleware.CartMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -73,13 +80,150 @@ WSGI_APPLICATION = 'ecommerce.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
+#
+# DJANGO_DB_ENGINE selects the backend:
+#
+# sqlite (default)  WAL journal, IMMEDIATE transactions and a busy timeout so
+#                   concurrent checkouts queue for the write lock instead of
+#                   failing with "database is locked".
+# postgresql        Persistent connections with health checks, or a psycopg
+#                   connection pool when DJANGO_DB_POOL_SIZE is set (the two
+#                   are mutually exclusive in Django).
+
+DB_ENGINE = os.environ.get('DJANGO_DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgresql':
+    DB_POOL_SIZE = int(os.environ.get('DJANGO_DB_POOL_SIZE', 0))
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DJANGO_DB_NAME', 'ecommerce'),
+            'USER': os.environ.get('DJANGO_DB_USER', ''),
+            'PASSWORD': os.environ.get('DJANGO_DB_PASSWORD', ''),
+            'HOST': os.environ.get('DJANGO_DB_HOST', ''),
+            'PORT': os.environ.get('DJANGO_DB_PORT', ''),
+            'CONN_MAX_AGE': 0 if DB_POOL_SIZE else int(os.environ.get('DJANGO_DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'pool': {'min_size': 2, 'max_size': DB_POOL_SIZE, 'timeout': 10},
+            } if DB_POOL_SIZE else {},
+        }
+    }
+elif DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DJANGO_DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': 20,  # seconds to wait for the write lock
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    'PRAGMA mmap_size=268435456;'
+                    'PRAGMA cache_size=-65536;'
+                    'PRAGMA temp_store=MEMORY;'
+                ),
+            },
+        }
+    }
+else:
+    raise ImproperlyConfigured(f"Unknown DJANGO_DB_ENGINE {DB_ENGINE!r}; use 'sqlite' or 'postgresql'.")
+
+# Read replica: set DJANGO_DB_REPLICA to the replica's host (PostgreSQL) or
+# file (SQLite). Catalog and order-history reads then go to the replica,
+# except for visitors who wrote within the last READ_YOUR_WRITES_SECONDS
+# (see main.db_routing). Locally, `manage.py sync_replica` copies the
+# primary SQLite file over the replica to stand in for replication.
+
+if os.environ.get('DJANGO_DB_REPLICA'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST' if DB_ENGINE == 'postgresql' else 'NAME': os.environ['DJANGO_DB_REPLICA'],
+        'TEST': {'MIRROR': 'default'},
+    }
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+DATABASE_ROUTERS = ['main.db_routing.PrimaryReplicaRouter']
+
+READ_YOUR_WRITES_SECONDS = 5
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# The default cache holds catalog pages, products, card fragments, their
+# version counters and cached_db sessions; carts have their own (below).
+#
+# In production set DJANGO_REDIS_URL: one Redis shared by every worker,
+# evicting least-recently-used entries (maxmemory-policy allkeys-lru) once
+# it reaches its memory limit. DJANGO_CACHE_DIR selects the file-based
+# backend instead, for a single host without Redis. It is sized explicitly,
+# because Django's default of 300 entries would cull constantly, and culls a
+# tenth of its files at random when full; every write also lists the cache
+# directory, so keep DJANGO_CACHE_MAX_ENTRIES modest there. Anything evicted
+# is rebuilt: sessions and carts are backed by the database, and an evicted
+# version counter restarts above every old one (see main.catalog_cache).
+#
+# Local memory is the fallback. It is private to each process, so it is
+# only accepted with DEBUG on.
+
+if os.environ.get('DJANGO_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['DJANGO_REDIS_URL'],
+        },
+        'carts': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['DJANGO_REDIS_URL'],
+            'KEY_PREFIX': 'carts',
+        },
     }
-}
+elif os.environ.get('DJANGO_CACHE_DIR'):
+    CACHE_MAX_ENTRIES = int(os.environ.get('DJANGO_CACHE_MAX_ENTRIES', 50000))
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ['DJANGO_CACHE_DIR'],
+            'OPTIONS': {'MAX_ENTRIES': CACHE_MAX_ENTRIES, 'CULL_FREQUENCY': 10},
+        },
+        'carts': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(os.environ['DJANGO_CACHE_DIR'], 'carts'),
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        },
+    }
+elif not DEBUG:
+    raise ImproperlyConfigured('Set DJANGO_REDIS_URL or DJANGO_CACHE_DIR so workers share one cache.')
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        },
+        'carts': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'carts',
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        },
+    }
+
+# Seconds cached catalog pages, products and card fragments are kept.
+# Edits invalidate them immediately through version counters.
+
+CATALOG_CACHE_TIMEOUT = 60 * 60
+
+# Carts live in their own cache (see main.cart) so catalog churn never evicts
+# them, and cart clicks never write the session table. Every cart is also
+# saved to the database, so a cart culled from the cache or lost with it is
+# restored on the next request; `manage.py sweep_stock_holds` deletes saved
+# carts untouched for CART_TIMEOUT. Sessions are read through the cache as
+# well.
+
+CART_CACHE_ALIAS = 'carts'
+CART_COOKIE_NAME = 'cart'
+CART_TIMEOUT = 60 * 60 * 24 * 14
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
 
 
 # Password validation
@@ -100,6 +244,18 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Login and registration (main.accounts)
+# Password hashing runs on AUTH_HASH_WORKERS threads per process; beyond
+# AUTH_HASH_QUEUE waiting calls, requests get a 503. Each client IP may
+# make AUTH_ATTEMPTS_PER_IP attempts, and each username may see
+# AUTH_ATTEMPTS_PER_USERNAME failed logins, per AUTH_THROTTLE_WINDOW seconds.
+
+AUTH_HASH_WORKERS = 2
+AUTH_HASH_QUEUE = 16
+AUTH_THROTTLE_WINDOW = 5 * 60
+AUTH_ATTEMPTS_PER_IP = 30
+AUTH_ATTEMPTS_PER_USERNAME = 5
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
@@ -117,6 +273,14 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.1/howto/static-files/
 
 STATIC_URL = 'static/'
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# collectstatic writes content-hashed copies plus .gz (and, with brotli
+# installed, .br) variants; main.middleware.StaticFilesMiddleware serves them.
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'main.storage.CompressedManifestStaticFilesStorage'},
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
@@ -124,3 +288,86 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/products/'
 MEDIA_ROOT = BASE_DIR / 'products'
 
+
+# Stock holds
+# Seconds a cart keeps stock reserved after its last change. Expired holds
+# are removed by `manage.py sweep_stock_holds`.
+
+STOCK_HOLD_TTL = 15 * 60
+
+# Catalog
+# Number of product cards per keyset-paginated catalog page.
+
+CATALOG_PAGE_SIZE = 24
+
+# Maximum number of ranked results returned by product search.
+
+SEARCH_RESULT_LIMIT = 48
+
+# Orders shown per page of the profile order history.
+
+ORDER_HISTORY_PAGE_SIZE = 10
+
+# Delivered orders older than this many months are moved to the archive
+# table by `manage.py archive_orders`.
+
+ORDER_ARCHIVE_MONTHS = 12
+
+# Live stock events
+# Seconds between stock updates on an open /events/stock/ stream; changes
+# within one interval are coalesced into a single event. Streams close after
+# STOCK_EVENTS_STREAM_SECONDS and browsers reconnect after
+# STOCK_EVENTS_RETRY_MS. Idle streams send a comment every
+# STOCK_EVENTS_KEEPALIVE seconds so proxies keep them open.
+
+STOCK_EVENTS_INTERVAL = 1
+STOCK_EVENTS_STREAM_SECONDS = 120
+STOCK_EVENTS_RETRY_MS = 3000
+STOCK_EVENTS_KEEPALIVE = 15
+
+# Profiling
+# Maximum SQL queries per GET request, by URL name. QueryProfileMiddleware
+# logs a warning when a view goes over, and the test suite fails on it.
+
+VIEW_QUERY_BUDGETS = {
+    'home': 5,
+    'product_list': 5,
+    'product_detail': 3,
+    'cart': 4,
+    'cart_api': 3,
+    'checkout': 3,
+    'profile': 7,  # a page reaching into archived orders adds one query
+}
+
+# Image derivatives
+# Resized copies of product images, written under MEDIA_ROOT/derivatives by
+# `manage.py build_image_derivatives` and whenever a product image changes.
+# `crop` makes square thumbnails; `sizes` is the <img sizes> hint.
+
+IMAGE_DERIVATIVE_PRESETS = {
+    'card': {'widths': (320, 640), 'crop': True, 'sizes': '(max-width: 600px) 100vw, 320px'},
+    'detail': {'widths': (640, 1280), 'crop': False, 'sizes': '(max-width: 768px) 100vw, 500px'},
+}
+
+IMAGE_DERIVATIVE_FORMATS = ('avif', 'webp', 'jpeg')
+
+# Background tasks
+# Queued in the main_task table and run by `manage.py run_tasks`. Failed
+# tasks are retried after TASK_RETRY_BACKOFF seconds, doubling up to
+# TASK_RETRY_BACKOFF_MAX, until TASK_MAX_ATTEMPTS. Tasks left running for
+# TASK_LOCK_TIMEOUT seconds are assumed orphaned and requeued.
+
+TASK_BATCH_SIZE = 10
+TASK_MAX_ATTEMPTS = 5
+TASK_RETRY_BACKOFF = 10
+TASK_RETRY_BACKOFF_MAX = 60 * 60
+TASK_LOCK_TIMEOUT = 10 * 60
+
+# Admin
+# Unfiltered changelists of tables with more rows than this show an
+# estimated total instead of running COUNT(*). Product search in the admin
+# returns at most ADMIN_SEARCH_LIMIT full-text matches.
+
+ADMIN_EXACT_COUNT_LIMIT = 100000
+
+ADMIN_SEARCH_LIMIT = 1000
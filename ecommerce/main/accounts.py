@@ -0,0 +1,137 @@
+import asyncio
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone as dt_timezone
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import check_password, make_password
+from django.contrib.auth.signals import user_login_failed
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import AuthAttempts
+
+# -------------------------
+# Password Hashing Pool
+# -------------------------
+# Hashing a password costs 100-400 ms of CPU. It runs on a small dedicated
+# pool, so however many logins or signups arrive at once, at most
+# AUTH_HASH_WORKERS cores per process hash while the rest keep serving the
+# catalog. hashlib releases the GIL, so threads hash in parallel. Beyond
+# AUTH_HASH_QUEUE waiting calls, new ones are turned away with HashingBusy
+# instead of queueing without bound.
+
+class HashingBusy(Exception):
+    pass
+
+_pool = ThreadPoolExecutor(max_workers=settings.AUTH_HASH_WORKERS, thread_name_prefix='password-hash')
+_slots = threading.BoundedSemaphore(settings.AUTH_HASH_WORKERS + settings.AUTH_HASH_QUEUE)
+
+async def _hash_in_pool(func, *args):
+    if not _slots.acquire(blocking=False):
+        raise HashingBusy()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_pool, partial(func, *args))
+    finally:
+        _slots.release()
+
+def _verify(password, encoded):
+    """Return (valid, new_encoded); new_encoded is set when the hasher or its cost has changed."""
+    rehashed = []
+    valid = check_password(password, encoded, setter=lambda raw: rehashed.append(make_password(raw)))
+    return valid, rehashed[0] if rehashed else None
+
+# -------------------------
+# Authentication
+# -------------------------
+async def aauthenticate(request, username, password):
+    """
+    Check a username and password the way ModelBackend does, hashing on the pool.
+
+    A stored hash made with an outdated hasher or iteration count is
+    replaced on successful login, as check_password() would. Returns the
+    active user, ready for alogin(), or None.
+    """
+    UserModel = get_user_model()
+    try:
+        user = await UserModel._default_manager.aget(**{UserModel.USERNAME_FIELD: username})
+    except UserModel.DoesNotExist:
+        # Hash anyway so unknown usernames take as long as wrong passwords.
+        await _hash_in_pool(make_password, password)
+        user = None
+    else:
+        valid, rehashed = await _hash_in_pool(_verify, password, user.password)
+        if not valid or not user.is_active:
+            user = None
+        elif rehashed:
+            user.password = rehashed
+            await UserModel._default_manager.filter(pk=user.pk).aupdate(password=rehashed)
+
+    if user is None:
+        await user_login_failed.asend(sender=__name__, credentials={'username': username}, request=request)
+        return None
+    user.backend = 'django.contrib.auth.backends.ModelBackend'
+    return user
+
+async def acreate_user(username, email, password):
+    UserModel = get_user_model()
+    encoded = await _hash_in_pool(make_password, password)
+    return await UserModel._default_manager.acreate(
+        username=UserModel.normalize_username(username),
+        email=UserModel._default_manager.normalize_email(email),
+        password=encoded,
+    )
+
+# -------------------------
+# Attempt Throttling
+# -------------------------
+# Counters are AuthAttempts rows in fixed AUTH_THROTTLE_WINDOW buckets: one
+# per client IP for every login or signup, and one per username for logins,
+# cleared by a successful one. An attempt is counted first and then compared
+# with the limit, so parallel attempts cannot all slip in before any of them
+# is counted; a throttled attempt is refused before any hashing. The rows
+# are bumped with a single UPDATE, which is atomic whatever cache backend
+# is configured.
+
+def _bucket(kind, value):
+    window = int(time.time() // settings.AUTH_THROTTLE_WINDOW)
+    digest = hashlib.md5(value.lower().encode(), usedforsecurity=False).hexdigest()
+    return f'auth-attempts:{kind}:{digest}:{window}', (window + 1) * settings.AUTH_THROTTLE_WINDOW
+
+def _ip_key(request):
+    return _bucket('ip', request.META.get('REMOTE_ADDR', ''))
+
+def _username_key(username):
+    return _bucket('user', username)
+
+def _count(bucket):
+    """Add one to ``bucket`` and return its new count."""
+    key, expires = bucket
+    with transaction.atomic():
+        if not AuthAttempts.objects.filter(key=key).update(count=F('count') + 1):
+            # First attempt in this window: drop the buckets of past windows.
+            AuthAttempts.objects.filter(expires_at__lte=timezone.now()).delete()
+            try:
+                with transaction.atomic():
+                    AuthAttempts.objects.create(
+                        key=key, count=1, expires_at=datetime.fromtimestamp(expires, dt_timezone.utc),
+                    )
+            except IntegrityError:
+                # A concurrent attempt created the bucket first; add to it instead.
+                AuthAttempts.objects.filter(key=key).update(count=F('count') + 1)
+        return AuthAttempts.objects.filter(key=key).values_list('count', flat=True).get()
+
+async def athrottle_attempt(request, username=None):
+    """Count an attempt from this client, and on ``username``; return whether it is over a limit."""
+    if await sync_to_async(_count)(_ip_key(request)) > settings.AUTH_ATTEMPTS_PER_IP:
+        return True
+    return bool(username) and await sync_to_async(_count)(_username_key(username)) > settings.AUTH_ATTEMPTS_PER_USERNAME
+
+async def aclear_failures(username):
+    await AuthAttempts.objects.filter(key=_username_key(username)[0]).adelete()
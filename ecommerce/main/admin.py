@@ -1,9 +1,176 @@
-from django.contrib import admin
-from .models import Category, Product, Order, OrderItem, Profile
+from django.conf import settings
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils import timezone
+from django.utils.functional import cached_property
+from django.utils.html import format_html_join
+from django.utils.safestring import mark_safe
 
-admin.site.register(Category)
-admin.site.register(Product)
-admin.site.register(Order)
-admin.site.register(OrderItem)
-admin.site.register(Profile)
+from .models import ArchivedOrder, Category, Product, Order, OrderItem, Profile, Task
+from . import search
 
+# -------------------------
+# Estimated Counts
+# -------------------------
+def _estimated_row_count(queryset):
+    """Cheap row-count estimate from planner statistics, or None if unavailable."""
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+        elif connection.vendor == 'sqlite':
+            # sqlite_stat1 only exists once ANALYZE has run; archive_orders
+            # refreshes it after moving rows out (see archive.refresh_statistics).
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                return None
+            # The first number of a stat line is the table's row count.
+            cursor.execute("SELECT CAST(stat AS INTEGER) FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table])
+        else:
+            return None
+        row = cursor.fetchone()
+    return row[0] if row and row[0] and row[0] > 0 else None
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that skips the exact COUNT(*) on large unfiltered changelists.
+
+    Filtered changelists, and tables smaller than ADMIN_EXACT_COUNT_LIMIT,
+    are still counted exactly.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = _estimated_row_count(queryset)
+            if estimate is not None and estimate > settings.ADMIN_EXACT_COUNT_LIMIT:
+                return estimate
+        return super().count
+
+class ScalableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+# -------------------------
+# Catalog Admin
+# -------------------------
+@admin.register(Category)
+class CategoryAdmin(admin.ModelAdmin):
+    list_display = ('name',)
+    search_fields = ('name',)
+    ordering = ('name',)
+
+@admin.register(Product)
+class ProductAdmin(ScalableAdmin):
+    list_display = ('name', 'category', 'price', 'stock')
+    list_select_related = ('category',)
+    list_filter = ('category',)
+    search_fields = ('name',)
+    autocomplete_fields = ('category',)
+    ordering = ('-id',)
+
+    def get_search_results(self, request, queryset, search_term):
+        # Use the full-text index instead of a LIKE scan over the whole table.
+        if search_term and search.is_supported():
+            ids = search.search_ids(search_term, settings.ADMIN_SEARCH_LIMIT)
+            return queryset.filter(id__in=ids), False
+        return super().get_search_results(request, queryset, search_term)
+
+# -------------------------
+# Order Admin
+# -------------------------
+class OrderItemInline(admin.TabularInline):
+    model = OrderItem
+    extra = 0
+    raw_id_fields = ('product',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product')
+
+@admin.register(Order)
+class OrderAdmin(ScalableAdmin):
+    list_display = ('id', 'user', 'status', 'payment_method', 'payment_status', 'total_price', 'created_at')
+    list_select_related = ('user',)
+    list_filter = ('status', 'payment_status', 'payment_method')
+    date_hierarchy = 'created_at'
+    search_fields = ('=id', '=user__username')
+    raw_id_fields = ('user',)
+    ordering = ('-created_at',)
+    inlines = (OrderItemInline,)
+    actions = ('mark_shipped', 'mark_delivered')
+
+    def _set_status(self, request, queryset, status):
+        updated = queryset.update(status=status)
+        self.message_user(request, f"Marked {updated} order(s) as {status.lower()}.", messages.SUCCESS)
+
+    @admin.action(description="Mark selected orders as shipped")
+    def mark_shipped(self, request, queryset):
+        self._set_status(request, queryset, 'Shipped')
+
+    @admin.action(description="Mark selected orders as delivered")
+    def mark_delivered(self, request, queryset):
+        self._set_status(request, queryset, 'Delivered')
+
+@admin.register(OrderItem)
+class OrderItemAdmin(ScalableAdmin):
+    list_display = ('id', 'order', 'product', 'quantity', 'price')
+    list_select_related = ('order__user', 'product')
+    search_fields = ('=order__id',)
+    raw_id_fields = ('order', 'product')
+    ordering = ('-id',)
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(ScalableAdmin):
+    """Read-only view of orders moved out by `manage.py archive_orders`."""
+    list_display = ('id', 'user', 'status', 'payment_method', 'total_price', 'created_at', 'archived_at')
+    list_select_related = ('user',)
+    search_fields = ('=id', '=user__username')
+    ordering = ('-id',)
+    fields = (
+        'id', 'user', 'status', 'payment_method', 'payment_status', 'total_price',
+        'created_at', 'archived_at', 'order_lines',
+    )
+    readonly_fields = fields
+
+    @admin.display(description="Items")
+    def order_lines(self, obj):
+        return format_html_join(
+            mark_safe('<br>'), '{} x {} (#{}) @ Rs. {}',
+            ((line.quantity, line.name, line.product_id, line.price) for line in obj.lines),
+        )
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(Profile)
+class ProfileAdmin(admin.ModelAdmin):
+    list_display = ('user', 'phone')
+    list_select_related = ('user',)
+    search_fields = ('=user__username', 'phone')
+    raw_id_fields = ('user',)
+
+# -------------------------
+# Task Admin
+# -------------------------
+@admin.register(Task)
+class TaskAdmin(ScalableAdmin):
+    list_display = ('id', 'name', 'status', 'attempts', 'run_at', 'locked_by', 'created_at')
+    list_filter = ('status', 'name')
+    search_fields = ('=id', 'name')
+    ordering = ('-id',)
+    readonly_fields = ('locked_by', 'locked_at', 'last_error', 'created_at')
+    actions = ('retry_now',)
+
+    @admin.action(description="Retry selected tasks now")
+    def retry_now(self, request, queryset):
+        updated = queryset.exclude(status=Task.RUNNING).update(
+            status=Task.QUEUED, run_at=timezone.now(), attempts=0,
+        )
+        self.message_user(request, f"Requeued {updated} task(s).", messages.SUCCESS)
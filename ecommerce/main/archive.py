@@ -0,0 +1,110 @@
+import calendar
+
+from django.db import connection, transaction
+from django.db.models import Value
+from django.utils import timezone
+
+from .models import ArchivedOrder, Order, OrderItem
+
+# -------------------------
+# Archiving
+# -------------------------
+# Delivered orders past ORDER_ARCHIVE_MONTHS are moved, a batch per
+# transaction, into ArchivedOrder: one row per order with its lines inline.
+# The hot Order/OrderItem tables then only hold recent and open orders, so
+# their size, indexes and vacuum work stay bounded however old the shop gets.
+
+def months_ago(months, now=None):
+    """Return the datetime ``months`` calendar months before ``now``."""
+    now = now or timezone.now()
+    month = now.month - 1 - months
+    year, month = now.year + month // 12, month % 12 + 1
+    day = min(now.day, calendar.monthrange(year, month)[1])
+    return now.replace(year=year, month=month, day=day)
+
+def archivable(cutoff):
+    return Order.objects.filter(status='Delivered', created_at__lt=cutoff)
+
+def archive_batch(cutoff, batch_size):
+    """Archive up to ``batch_size`` of the oldest archivable orders; return how many moved."""
+    with transaction.atomic():
+        ids = list(archivable(cutoff).select_for_update().order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return 0
+        orders = Order.objects.filter(id__in=ids).prefetch_related('items__product').order_by('id')
+        ArchivedOrder.objects.bulk_create([
+            ArchivedOrder(
+                id=order.id,
+                user_id=order.user_id,
+                total_price=order.total_price,
+                status=order.status,
+                payment_method=order.payment_method,
+                payment_status=order.payment_status,
+                created_at=order.created_at,
+                items=[[line.product_id, line.name, line.quantity, str(line.price)] for line in order.lines],
+            )
+            for order in orders
+        ])
+        OrderItem.objects.filter(order_id__in=ids).delete()
+        Order.objects.filter(id__in=ids).delete()
+    return len(ids)
+
+def archive_orders(cutoff, batch_size=500):
+    """Archive every delivered order created before ``cutoff``, yielding each batch's size."""
+    while moved := archive_batch(cutoff, batch_size):
+        yield moved
+
+def refresh_statistics():
+    """Re-ANALYZE the order tables so admin row-count estimates follow the archive run."""
+    with connection.cursor() as cursor:
+        for model in (Order, OrderItem, ArchivedOrder):
+            cursor.execute(f'ANALYZE {connection.ops.quote_name(model._meta.db_table)}')
+
+def archive_horizon():
+    """The latest day with archived orders, or None; rollups before it can no longer be rebuilt."""
+    latest = ArchivedOrder.objects.order_by('-created_at').values_list('created_at', flat=True).first()
+    return timezone.localdate(latest) if latest else None
+
+# -------------------------
+# Order History
+# -------------------------
+class OrderHistory:
+    """
+    A user's live and archived orders together, newest first.
+
+    Supports count() and slicing, so a Paginator can page across both
+    tables. A page's keys are picked from a UNION ALL of both tables'
+    (created_at, id), so an old order that is still open sorts among the
+    archived ones by date; then only that page's orders are loaded, from
+    the table(s) they live in.
+    """
+
+    def __init__(self, user):
+        self.live = Order.objects.filter(user=user).prefetch_related('items__product')
+        self.archived = ArchivedOrder.objects.filter(user=user)
+        self.keys = (
+            Order.objects.filter(user=user)
+            .annotate(archived=Value(False)).values_list('created_at', 'id', 'archived')
+            .union(
+                ArchivedOrder.objects.filter(user=user)
+                .annotate(archived=Value(True)).values_list('created_at', 'id', 'archived'),
+                all=True,
+            )
+            .order_by('-created_at', '-id')
+        )
+
+    def count(self):
+        return self.keys.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        keys = list(self.keys[index])
+        live_ids = [order_id for _, order_id, archived in keys if not archived]
+        archived_ids = [order_id for _, order_id, archived in keys if archived]
+        orders = {}
+        if live_ids:
+            orders.update((order.id, order) for order in self.live.filter(id__in=live_ids))
+        if archived_ids:
+            orders.update((order.id, order) for order in self.archived.filter(id__in=archived_ids))
+        return [orders[order_id] for _, order_id, _ in keys]
@@ -0,0 +1,93 @@
+import json
+import math
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+# -------------------------
+# Measurement Helpers
+# -------------------------
+def percentile(values, pct):
+    """Nearest-rank percentile of ``values`` (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+@contextmanager
+def count_queries():
+    """Count queries on every database connection of the current thread."""
+    counter = QueryCounter()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(counter))
+        yield counter
+
+class FlowRecorder:
+    """Collect latency and query samples per named flow."""
+
+    def __init__(self):
+        self.samples = {}
+
+    @contextmanager
+    def measure(self, flow):
+        with count_queries() as counter:
+            start = time.perf_counter()
+            yield
+            elapsed = time.perf_counter() - start
+        latencies, queries = self.samples.setdefault(flow, ([], []))
+        latencies.append(elapsed)
+        queries.append(counter.count)
+
+    def summary(self):
+        result = {}
+        for flow, (latencies, queries) in self.samples.items():
+            total = sum(latencies)
+            result[flow] = {
+                'requests': len(latencies),
+                'throughput_rps': len(latencies) / total if total else 0.0,
+                'p50_ms': percentile(latencies, 50) * 1000,
+                'p95_ms': percentile(latencies, 95) * 1000,
+                'p99_ms': percentile(latencies, 99) * 1000,
+                'mean_queries': sum(queries) / len(queries),
+                'max_queries': max(queries),
+            }
+        return result
+
+# -------------------------
+# Reporting
+# -------------------------
+REPORT_COLUMNS = ('requests', 'throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms', 'mean_queries')
+
+def format_report(summary, baseline=None):
+    header = f"{'flow':<20}" + ''.join(f'{c:>16}' for c in REPORT_COLUMNS)
+    lines = [header, '-' * len(header)]
+    for flow, stats in summary.items():
+        lines.append(f'{flow:<20}' + ''.join(f'{stats[c]:>16.2f}' for c in REPORT_COLUMNS))
+        previous = (baseline or {}).get(flow)
+        if previous:
+            deltas = []
+            for column in REPORT_COLUMNS:
+                before = previous.get(column) or 0
+                change = (stats[column] - before) / before * 100 if before else 0.0
+                deltas.append(f'{change:>+15.1f}%')
+            lines.append(f"{'  vs baseline':<20}" + ''.join(deltas))
+    return '\n'.join(lines)
+
+def save_results(path, summary, meta):
+    with open(path, 'w') as f:
+        json.dump({'meta': meta, 'flows': summary}, f, indent=2, sort_keys=True)
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)['flows']
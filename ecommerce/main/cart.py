@@ -0,0 +1,412 @@
+import re
+import secrets
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from .models import Product, SavedCart
+from . import catalog_cache, inventory
+
+# -------------------------
+# Cart Encoding
+# -------------------------
+# Carts are stored as "product_id:quantity" pairs joined by commas, e.g.
+# "12:1,40:3", which is a fraction of the size of a pickled dict. The stored
+# record prefixes the pairs with the cart version, bumped on every change
+# (the cart API's ETag), and the running total with the catalog version it
+# was priced at, e.g. "7;30.00@1718000000000;12:1,40:3". An empty total,
+# or one priced at an older catalog version, is recomputed from current
+# prices, so a price change never leaves a drifted total behind.
+
+def encode_cart(cart):
+    return ','.join(f'{pid}:{qty}' for pid, qty in cart.items() if qty > 0)
+
+def decode_cart(value):
+    cart = {}
+    for pair in (value or '').split(','):
+        pid, _, qty = pair.partition(':')
+        if pid.isdigit() and qty.isdigit() and int(qty) > 0:
+            cart[pid] = int(qty)
+    return cart
+
+def encode_record(version, total, cart, priced_at=None):
+    if total is None:
+        total = ''
+    elif priced_at is not None:
+        total = f'{total}@{priced_at}'
+    return f"{version};{total};{encode_cart(cart)}"
+
+def decode_record(value):
+    """Return ``(version, total, priced_at, cart)`` from a stored record."""
+    if not value:
+        return 0, Decimal('0'), None, {}
+    if value.count(';') != 2:
+        return 0, None, None, decode_cart(value)  # bare pairs, stored before versioning
+    version, total, pairs = value.split(';')
+    total, _, priced_at = total.partition('@')
+    return (
+        int(version or 0),
+        Decimal(total) if total else None,
+        int(priced_at) if priced_at.isdigit() else None,
+        decode_cart(pairs),
+    )
+
+# -------------------------
+# Cart Storage
+# -------------------------
+# Carts live in the ``carts`` cache under their owner: "user:<id>" for
+# signed-in visitors, so the cart follows them between devices, and
+# "anon:<token>" for anonymous ones, where the token is a random value kept
+# in a cookie. Views read and change the cart through get_cart() and
+# save_cart(); CartMiddleware writes it back once per request, however
+# many times it changed, and sets the cookie for new anonymous carts.
+#
+# Every cart is also written through to SavedCart, the way cached_db
+# sessions are, and read back from it when the cache misses, so carts
+# survive restarts, cache culling and per-process caches. A visitor given a
+# new token this request cannot have a saved cart, so that lookup is
+# skipped, and a newly priced total alone is only written to the cache: the
+# saved record keeps its older total with the catalog version it was priced
+# at, and is repriced if restored. Nothing here touches the session. The a-prefixed functions are
+# the same operations for async views.
+
+_TOKEN_RE = re.compile(r'^[A-Za-z0-9_-]{22}$')
+
+def _store():
+    return caches[settings.CART_CACHE_ALIAS]
+
+def _key(owner):
+    return f'cart:{owner}'
+
+def _read_record(owner, saved=True):
+    record = _store().get(_key(owner))
+    if record is None and saved:
+        record = SavedCart.objects.filter(owner=owner).values_list('record', flat=True).first()
+        if record is not None:
+            _store().set(_key(owner), record, settings.CART_TIMEOUT)
+    return record
+
+async def _aread_record(owner, saved=True):
+    record = await _store().aget(_key(owner))
+    if record is None and saved:
+        record = await SavedCart.objects.filter(owner=owner).values_list('record', flat=True).afirst()
+        if record is not None:
+            await _store().aset(_key(owner), record, settings.CART_TIMEOUT)
+    return record
+
+def _saved_cart_upsert(owner, record):
+    return {
+        'objs': [SavedCart(owner=owner, record=record)],
+        'update_conflicts': True,
+        'unique_fields': ['owner'],
+        'update_fields': ['record', 'updated_at'],
+    }
+
+def read_cart(owner):
+    return decode_record(_read_record(owner))[-1]
+
+async def aread_cart(owner):
+    return decode_record(await _aread_record(owner))[-1]
+
+def write_cart(owner, cart, version=1, total=None, priced_at=None, persist=True):
+    """Store ``cart``; an empty cart that never changed is simply dropped."""
+    if cart or version:
+        record = encode_record(version, total, cart, priced_at)
+        _store().set(_key(owner), record, settings.CART_TIMEOUT)
+        if persist:
+            SavedCart.objects.bulk_create(**_saved_cart_upsert(owner, record))
+    else:
+        _store().delete(_key(owner))
+        SavedCart.objects.filter(owner=owner).delete()
+
+async def awrite_cart(owner, cart, version=1, total=None, priced_at=None, persist=True):
+    if cart or version:
+        record = encode_record(version, total, cart, priced_at)
+        await _store().aset(_key(owner), record, settings.CART_TIMEOUT)
+        if persist:
+            await SavedCart.objects.abulk_create(**_saved_cart_upsert(owner, record))
+    else:
+        await _store().adelete(_key(owner))
+        await SavedCart.objects.filter(owner=owner).adelete()
+
+def sweep_saved_carts():
+    """Delete saved carts untouched for CART_TIMEOUT and return how many were removed."""
+    cutoff = timezone.now() - timedelta(seconds=settings.CART_TIMEOUT)
+    deleted, _ = SavedCart.objects.filter(updated_at__lt=cutoff).delete()
+    return deleted
+
+def _owner(request, user):
+    if user is not None and user.is_authenticated:
+        return f'user:{user.pk}'
+    token = getattr(request, '_cart_token', None) or request.COOKIES.get(settings.CART_COOKIE_NAME, '')
+    if not _TOKEN_RE.match(token):
+        token = secrets.token_urlsafe(16)
+        request._cart_token_is_new = True
+    request._cart_token = token
+    return f'anon:{token}'
+
+def cart_owner(request):
+    """Return the key this visitor's cart and stock holds are recorded under."""
+    return _owner(request, getattr(request, 'user', None))
+
+async def acart_owner(request):
+    return _owner(request, await request.auser() if hasattr(request, 'auser') else None)
+
+def _cached_state(request, owner):
+    state = getattr(request, '_cart_state', None)
+    return state if state is not None and state['owner'] == owner else None
+
+def _load_state(request, owner, record):
+    version, total, priced_at, cart = decode_record(record)
+    request._cart_state = {
+        'owner': owner, 'cart': cart, 'version': version, 'total': total, 'priced_at': priced_at, 'dirty': False,
+        'loaded_version': version,
+    }
+    return request._cart_state
+
+def cart_state(request):
+    """The request's cart with its owner, version and running total."""
+    owner = cart_owner(request)
+    saved = not getattr(request, '_cart_token_is_new', False)
+    return _cached_state(request, owner) or _load_state(request, owner, _read_record(owner, saved))
+
+async def acart_state(request):
+    owner = await acart_owner(request)
+    saved = not getattr(request, '_cart_token_is_new', False)
+    return _cached_state(request, owner) or _load_state(request, owner, await _aread_record(owner, saved))
+
+def get_cart(request):
+    return cart_state(request)['cart']
+
+async def aget_cart(request):
+    return (await acart_state(request))['cart']
+
+def _change(state, cart, total=None, priced_at=None):
+    state.update(
+        cart=cart,
+        version=state['version'] + 1,
+        total=total if cart else Decimal('0'),
+        priced_at=priced_at,
+        dirty=True,
+    )
+
+def save_cart(request, cart):
+    """Replace the cart; its total is recomputed when next needed."""
+    _change(cart_state(request), cart)
+
+async def asave_cart(request, cart):
+    _change(await acart_state(request), cart)
+
+def remember_total(state, data):
+    """Store the total of a freshly priced cart without counting it as a cart change."""
+    if (state['total'], state['priced_at']) != (data['total_amount'], data['priced_at']):
+        state.update(total=data['total_amount'], priced_at=data['priced_at'], dirty=True)
+
+def _set_cart_cookie(request, response, state):
+    if getattr(request, '_cart_token_is_new', False) and state is not None and state['cart']:
+        response.set_cookie(
+            settings.CART_COOKIE_NAME, request._cart_token,
+            max_age=settings.CART_TIMEOUT, httponly=True, samesite='Lax',
+        )
+    return response
+
+def flush_cart(request, response):
+    """Write a changed cart back to the store and set the cart cookie if needed."""
+    state = getattr(request, '_cart_state', None)
+    if state is not None and state['dirty']:
+        write_cart(
+            state['owner'], state['cart'], state['version'], state['total'], state['priced_at'],
+            persist=state['version'] != state['loaded_version'],
+        )
+        state.update(dirty=False, loaded_version=state['version'])
+    return _set_cart_cookie(request, response, state)
+
+async def aflush_cart(request, response):
+    state = getattr(request, '_cart_state', None)
+    if state is not None and state['dirty']:
+        await awrite_cart(
+            state['owner'], state['cart'], state['version'], state['total'], state['priced_at'],
+            persist=state['version'] != state['loaded_version'],
+        )
+        state.update(dirty=False, loaded_version=state['version'])
+    return _set_cart_cookie(request, response, state)
+
+def merge_anonymous_cart(request, anonymous_owner):
+    """
+    Fold the cart built before login into the signed-in user's cart.
+
+    Lines from the anonymous cart replace the same products in the saved
+    cart, the anonymous cart is dropped, and its stock holds move with it.
+    """
+    owner = cart_owner(request)
+    if anonymous_owner == owner:
+        return
+    anonymous = read_cart(anonymous_owner)
+    if anonymous:
+        save_cart(request, {**get_cart(request), **anonymous})
+        write_cart(anonymous_owner, {}, version=0)
+        inventory.transfer(anonymous_owner, owner)
+
+# -------------------------
+# Cart Pricing
+# -------------------------
+def _price(cart, products, available, priced_at):
+    items = []
+    total_amount = Decimal('0')
+    total_items = 0
+
+    for pid, quantity in cart.items():
+        product = products.get(int(pid))
+        if product is None:
+            continue
+        subtotal = product.price * quantity
+        total_amount += subtotal
+        total_items += quantity
+        items.append({
+            'product': product,
+            'quantity': quantity,
+            'subtotal': subtotal,
+            'available': available[product.id],
+        })
+
+    return {
+        'items': items,
+        'total_amount': total_amount,
+        'total_items': total_items,
+        'priced_at': priced_at,
+    }
+
+def build_cart(cart, owner=None):
+    """
+    Resolve a {product_id: quantity} cart into priced lines.
+
+    All products are loaded with a single in_bulk() query, so the cost
+    stays constant no matter how many lines the cart holds. Lines whose
+    product no longer exists are skipped. When ``owner`` is given, each
+    line also carries the quantity still available to that cart once
+    other carts' stock holds are subtracted (one extra aggregate query).
+    """
+    # Read the catalog version before the prices, so a concurrent price
+    # change can only make the stamp look older than the prices, not newer.
+    priced_at = catalog_cache.catalog_version()
+    products = Product.objects.in_bulk([int(pid) for pid in cart])
+    if owner is not None:
+        available = inventory.available_quantities(products.values(), owner)
+    else:
+        available = {pid: p.stock for pid, p in products.items()}
+    return _price(cart, products, available, priced_at)
+
+async def abuild_cart(cart, owner=None):
+    """build_cart() on the async ORM, with the same two queries."""
+    priced_at = await catalog_cache.acatalog_version()
+    products = await Product.objects.ain_bulk([int(pid) for pid in cart])
+    if owner is not None:
+        available = await inventory.aavailable_quantities(products.values(), owner)
+    else:
+        available = {pid: p.stock for pid, p in products.items()}
+    return _price(cart, products, available, priced_at)
+
+# -------------------------
+# Cart Updates
+# -------------------------
+MAX_LINES_PER_UPDATE = 100
+
+async def atotals(state):
+    """Running totals of the cart, repricing it only if the total is unknown or stale."""
+    if state['total'] is None or state['priced_at'] != await catalog_cache.acatalog_version():
+        remember_total(state, await abuild_cart(state['cart']))
+    return {'total_items': sum(state['cart'].values()), 'total_amount': state['total']}
+
+async def aset_quantities(request, quantities):
+    """
+    Set the cart quantity of several products at once; 0 removes the line.
+
+    Only the products being changed are loaded and checked against stock,
+    and their holds are written in one upsert, so the work depends on the
+    size of the update, not of the cart.
+    Quantities above what is available are capped, though an increase
+    never takes a line below what it already holds, and the running total
+    moves by the price difference of the changed lines, unless it was priced
+    at an older catalog version, in which case it is dropped for repricing.
+
+    Returns ``(lines, errors)``: one priced line per known product, and an
+    error for every unknown product or capped quantity.
+    """
+    state = await acart_state(request)
+    owner = state['owner']
+    cart = dict(state['cart'])
+    priced_at = await catalog_cache.acatalog_version()
+    total = state['total'] if state['priced_at'] == priced_at else None
+    products = await Product.objects.ain_bulk(list(quantities))
+    available = await inventory.aavailable_quantities(products.values(), owner)
+    lines, errors, changed = [], [], {}
+
+    for product_id, wanted in quantities.items():
+        previous = cart.get(str(product_id), 0)
+        product = products.get(product_id)
+        if product is None:
+            if previous:
+                # The product was deleted; let the line go and reprice later.
+                del cart[str(product_id)]
+                total = None
+            errors.append({'product_id': product_id, 'code': 'unknown', 'message': "No such product."})
+            continue
+
+        quantity = min(wanted, available[product_id])
+        if wanted > previous:
+            # Stock that dropped below the line is not a reason to shrink it.
+            quantity = max(quantity, previous)
+        if quantity < wanted:
+            errors.append({
+                'product_id': product_id,
+                'code': 'insufficient_stock',
+                'message': f"Insufficient stock. Only {available[product_id]} available.",
+                'available': available[product_id],
+            })
+        if quantity:
+            cart[str(product_id)] = quantity
+        else:
+            cart.pop(str(product_id), None)
+        if quantity != previous:
+            changed[product_id] = quantity
+            if total is not None:
+                total += product.price * (quantity - previous)
+        lines.append({
+            'product': product,
+            'quantity': quantity,
+            'subtotal': product.price * quantity,
+            'available': available[product_id],
+        })
+
+    if changed:
+        await inventory.aset_holds(owner, changed)
+    if cart != state['cart']:
+        _change(state, cart, total, priced_at)
+    return lines, errors
+
+def serialize_item(item):
+    product = item['product']
+    return {
+        'product_id': product.id,
+        'name': product.name,
+        'price': float(product.price),
+        'quantity': item['quantity'],
+        'subtotal': float(item['subtotal']),
+        'stock': item['available'],
+    }
+
+def serialize_cart(data):
+    return {
+        'items': [serialize_item(item) for item in data['items']],
+        'total_amount': float(data['total_amount']),
+        'total_items': data['total_items'],
+    }
+
+def serialize_totals(totals):
+    return {
+        'total_amount': float(totals['total_amount']),
+        'total_items': totals['total_items'],
+    }
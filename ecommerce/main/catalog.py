@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.db.models.functions import Substr
+
+from .models import Product
+
+# -------------------------
+# Catalog Listing
+# -------------------------
+SUMMARY_LENGTH = 200  # enough characters for the truncatewords:10 card text
+
+def listing_queryset():
+    """
+    Products as shown on catalog cards.
+
+    The full description is deferred; cards only need a short ``summary``
+    prefix, which the database cuts for us.
+    """
+    return (
+        Product.objects
+        .defer('description')
+        .annotate(summary=Substr('description', 1, SUMMARY_LENGTH))
+    )
+
+def catalog_page(category_id=None, after=None, page_size=None, in_stock=False):
+    """
+    Return ``(products, next_cursor)`` for one page of the catalog.
+
+    Pages are keyset-paginated on descending id: ``after`` is the id of the
+    last product of the previous page, so every page is an index range scan
+    no matter how deep the visitor has scrolled. ``next_cursor`` is None on
+    the last page. ``in_stock`` limits the page to products with stock left.
+    """
+    page_size = page_size or settings.CATALOG_PAGE_SIZE
+    products = listing_queryset()
+    if category_id is not None:
+        products = products.filter(category_id=category_id)
+    if in_stock:
+        products = products.filter(stock__gt=0)
+    if after is not None:
+        products = products.filter(id__lt=after)
+
+    rows = list(products.order_by('-id')[:page_size + 1])
+    next_cursor = rows[page_size - 1].id if len(rows) > page_size else None
+    return rows[:page_size], next_cursor
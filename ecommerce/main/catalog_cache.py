@@ -0,0 +1,166 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .catalog import catalog_page
+from .db_routing import use_primary
+from .models import Category, Product
+
+# -------------------------
+# Version Counters
+# -------------------------
+# Cached catalog entries embed the version of everything they were built
+# from. Writes bump the counters (see signals.py), so stale entries are
+# never read again and simply age out of the cache.
+#
+# Missing counters start from the current time in milliseconds rather than
+# 1, so a counter evicted by the cache can never fall back to a value that
+# old entries were stored under.
+
+ALL = 'all'
+
+def _version_key(kind, key):
+    return f'catalog:v:{kind}:{key}'
+
+def versions(kind, keys):
+    """Return {key: version} for many counters with one cache round trip."""
+    names = {_version_key(kind, k): k for k in keys}
+    found = cache.get_many(names)
+    result = {names[name]: value for name, value in found.items()}
+    for name in names.keys() - found.keys():
+        cache.add(name, int(time.time() * 1000), None)
+        result[names[name]] = cache.get(name)
+    return result
+
+def version(kind, key):
+    return versions(kind, [key])[key]
+
+async def aversion(kind, key):
+    name = _version_key(kind, key)
+    value = await cache.aget(name)
+    if value is None:
+        await cache.aadd(name, int(time.time() * 1000), None)
+        value = await cache.aget(name)
+    return value
+
+def catalog_version():
+    """Counter bumped by every product and category write; cart totals are stamped with it."""
+    return version('category', ALL)
+
+async def acatalog_version():
+    return await aversion('category', ALL)
+
+def bump(kind, key):
+    try:
+        cache.incr(_version_key(kind, key))
+    except ValueError:
+        cache.add(_version_key(kind, key), int(time.time() * 1000), None)
+
+def bump_product(product_id, category_ids=()):
+    bump('product', product_id)
+    for category_id in category_ids:
+        bump('category', category_id)
+    bump('category', ALL)
+
+def bump_category(category_id):
+    bump('category', category_id)
+    bump('category', ALL)
+
+# -------------------------
+# Cached Catalog Reads
+# -------------------------
+# Cache misses are filled from the primary: a fill from a lagging replica
+# right after a version bump would be stored under the new version and
+# served stale until it expired. Cache hits only re-read stock, which may
+# come from the replica.
+
+def _live_rows(products):
+    return Product.objects.filter(id__in=[p.id for p in products]).values_list('id', 'stock', 'updated_at')
+
+def _apply_live(products, rows):
+    live = {product_id: (stock, updated_at) for product_id, stock, updated_at in rows}
+    for product in products:
+        product.stock, product.updated_at = live.get(product.id, (0, product.updated_at))
+    return products
+
+def refresh_stock(products):
+    """Overwrite the cached stock and updated_at of ``products`` with live values (one query)."""
+    return _apply_live(products, _live_rows(products))
+
+async def arefresh_stock(products):
+    return _apply_live(products, [row async for row in _live_rows(products)])
+
+def attach_card_versions(products):
+    """Set ``cache_version`` on each product for the product-card fragment cache."""
+    product_versions = versions('product', [p.id for p in products])
+    for product in products:
+        product.cache_version = product_versions[product.id]
+    return products
+
+def cached_catalog_page(category_id=None, after=None, in_stock=False):
+    """
+    catalog_page() served from cache, with stock read fresh from the database.
+
+    Filtered pages are keyed by their category's version and unfiltered pages
+    by the catalog-wide version, so editing one category leaves the cached
+    pages of every other category intact. Sales do not bump versions, so
+    in-stock pages drop products that sold out since the page was cached.
+    """
+    scope = ALL if category_id is None else category_id
+    key = 'catalog:page:{}:{}:{}:{}:v{}'.format(
+        scope, after, int(in_stock), settings.CATALOG_PAGE_SIZE, version('category', scope),
+    )
+    page = cache.get(key)
+    if page is None:
+        with use_primary():
+            page = catalog_page(category_id, after, in_stock=in_stock)
+        cache.set(key, page, settings.CATALOG_CACHE_TIMEOUT)
+
+    products, next_cursor = page
+    refresh_stock(products)
+    if in_stock:
+        products = [p for p in products if p.stock > 0]
+    attach_card_versions(products)
+    return products, next_cursor
+
+def cached_product(product_id):
+    """Return a product (or None) from cache, with stock read fresh."""
+    product_version = version('product', product_id)
+    key = f"catalog:product:{product_id}:v{product_version}"
+    product = cache.get(key)
+    if product is None:
+        with use_primary():
+            product = Product.objects.filter(id=product_id).first()
+        if product is None:
+            return None
+        cache.set(key, product, settings.CATALOG_CACHE_TIMEOUT)
+    else:
+        refresh_stock([product])
+    product.cache_version = product_version
+    return product
+
+async def acached_product(product_id):
+    """cached_product() for async views."""
+    product_version = await aversion('product', product_id)
+    key = f"catalog:product:{product_id}:v{product_version}"
+    product = await cache.aget(key)
+    if product is None:
+        with use_primary():
+            product = await Product.objects.filter(id=product_id).afirst()
+        if product is None:
+            return None
+        await cache.aset(key, product, settings.CATALOG_CACHE_TIMEOUT)
+    else:
+        await arefresh_stock([product])
+    product.cache_version = product_version
+    return product
+
+def cached_categories():
+    key = f"catalog:categories:v{version('category', ALL)}"
+    categories = cache.get(key)
+    if categories is None:
+        with use_primary():
+            categories = list(Category.objects.order_by('name'))
+        cache.set(key, categories, settings.CATALOG_CACHE_TIMEOUT)
+    return categories
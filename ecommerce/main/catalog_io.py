@@ -0,0 +1,88 @@
+import csv
+import json
+import time
+from decimal import Decimal
+
+# -------------------------
+# Catalog File Formats
+# -------------------------
+# Catalog files have one product per CSV row or JSON line, with these
+# columns. ``id`` is optional on import: rows with an id update that
+# product (or create it with that id), rows without one are inserted.
+
+CATALOG_COLUMNS = ('id', 'name', 'price', 'description', 'stock', 'category', 'image')
+
+def detect_format(path, fmt=None):
+    if fmt:
+        return fmt
+    return 'jsonl' if str(path).endswith(('.jsonl', '.ndjson')) else 'csv'
+
+def read_rows(f, fmt):
+    """Yield one dict per record, streaming from an open text file."""
+    if fmt == 'csv':
+        yield from csv.DictReader(f)
+    else:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+class RowWriter:
+    def __init__(self, f, fmt, columns):
+        self.f = f
+        self.fmt = fmt
+        self.columns = columns
+        if fmt == 'csv':
+            self.writer = csv.writer(f)
+            self.writer.writerow(columns)
+
+    def write(self, values):
+        if self.fmt == 'csv':
+            self.writer.writerow(values)
+        else:
+            self.f.write(json.dumps(dict(zip(self.columns, values)), default=str) + '\n')
+
+def parse_product_row(row):
+    """Normalise a raw catalog record; raises ValueError on bad data."""
+    name = (row.get('name') or '').strip()
+    category = (row.get('category') or '').strip()
+    if not name or not category:
+        raise ValueError("name and category are required")
+    product_id = row.get('id')
+    price = Decimal(str(row['price']))
+    stock = int(row.get('stock') or 0)
+    # Checked here so a bad row is skipped instead of failing the batch on
+    # the table's CHECK constraints.
+    if price < 0 or stock < 0:
+        raise ValueError("price and stock must not be negative")
+    return {
+        'id': int(product_id) if product_id not in (None, '') else None,
+        'name': name,
+        'price': price,
+        'description': row.get('description') or '',
+        'stock': stock,
+        'category': category,
+        'image': row.get('image') or '',
+    }
+
+class Progress:
+    """Print a row count and throughput line every ``every`` rows."""
+
+    def __init__(self, write, every=10000):
+        self.write = write
+        self.every = every
+        self.count = 0
+        self.start = time.perf_counter()
+
+    def add(self, n=1):
+        before = self.count
+        self.count += n
+        if self.count // self.every != before // self.every:
+            self.report()
+
+    @property
+    def rate(self):
+        elapsed = time.perf_counter() - self.start
+        return self.count / elapsed if elapsed else 0.0
+
+    def report(self, label='rows'):
+        self.write(f"{self.count} {label} ({self.rate:,.0f}/s)")
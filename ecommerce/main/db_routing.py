@@ -0,0 +1,94 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PRIMARY = DEFAULT_DB_ALIAS
+REPLICA = 'replica'
+
+# Catalog and order-history models whose reads may be served by the replica.
+# Sessions, auth and stock holds always stay on the primary.
+REPLICA_MODELS = {
+    'main.category',
+    'main.product',
+    'main.order',
+    'main.orderitem',
+    'main.dailyproductsales',
+    'main.dailypaymentsales',
+}
+
+_pinned = ContextVar('pinned_to_primary', default=False)
+_wrote = ContextVar('wrote_to_primary', default=False)
+
+# -------------------------
+# Primary Pinning
+# -------------------------
+@contextmanager
+def use_primary():
+    """Send every read inside the block (or decorated view) to the primary."""
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+def has_written():
+    """Whether the current request or task has written a replicated model."""
+    return _wrote.get()
+
+@contextmanager
+def request_scope(pinned=False):
+    """Start a fresh pinning scope, e.g. for one request."""
+    pinned_token = _pinned.set(pinned)
+    wrote_token = _wrote.set(False)
+    try:
+        yield
+    finally:
+        _wrote.reset(wrote_token)
+        _pinned.reset(pinned_token)
+
+# -------------------------
+# Router
+# -------------------------
+class PrimaryReplicaRouter:
+    """
+    Route catalog and order-history reads to the ``replica`` alias.
+
+    Reads go to the primary instead when no replica is configured, inside a
+    transaction on the primary (so SELECT ... FOR UPDATE locks real rows),
+    after the current request has written a replicated model, or while the
+    context is pinned by ``use_primary()`` or the read-your-writes cookie.
+    All writes go to the primary.
+    """
+
+    def __init__(self):
+        self.replica = REPLICA if REPLICA in settings.DATABASES else None
+
+    def _replicated(self, model):
+        return model._meta.label_lower in REPLICA_MODELS
+
+    def db_for_read(self, model, **hints):
+        if not self._replicated(model):
+            return None
+        if (
+            self.replica is None
+            or _pinned.get()
+            or _wrote.get()
+            or connections[PRIMARY].in_atomic_block
+        ):
+            return PRIMARY
+        return self.replica
+
+    def db_for_write(self, model, **hints):
+        if self._replicated(model):
+            _wrote.set(True)
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows, so objects from either side relate.
+        return {obj1._state.db, obj2._state.db} <= {PRIMARY, REPLICA}
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica receives its schema through replication.
+        return db != REPLICA
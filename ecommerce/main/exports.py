@@ -0,0 +1,108 @@
+import csv
+import json
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+
+from .models import ArchivedOrder, OrderItem
+
+# -------------------------
+# Order Line Export
+# -------------------------
+ORDER_LINE_COLUMNS = (
+    'order_id', 'created_at', 'username', 'status', 'payment_method', 'payment_status',
+    'order_total', 'product_id', 'product_name', 'quantity', 'unit_price', 'line_total',
+)
+
+def parse_date_range(start=None, end=None):
+    """
+    Turn inclusive YYYY-MM-DD bounds into aware datetimes ``[start, end)``.
+
+    Raises ValueError on malformed dates.
+    """
+    tz = timezone.get_current_timezone()
+    start_at = datetime.combine(date.fromisoformat(start), time.min, tz) if start else None
+    end_at = datetime.combine(date.fromisoformat(end) + timedelta(days=1), time.min, tz) if end else None
+    return start_at, end_at
+
+def order_lines(start_at=None, end_at=None, chunk_size=2000):
+    """
+    Yield one tuple per order line, in ORDER_LINE_COLUMNS order.
+
+    Archived orders come first, then live ones. Each table is read with one
+    query through iterator(), which uses a server-side cursor where the
+    database supports one, so memory stays flat however many lines are
+    exported.
+    """
+    yield from _archived_order_lines(start_at, end_at, chunk_size)
+    items = OrderItem.objects.all()
+    if start_at:
+        items = items.filter(order__created_at__gte=start_at)
+    if end_at:
+        items = items.filter(order__created_at__lt=end_at)
+    rows = items.order_by('order_id', 'id').values_list(
+        'order_id', 'order__created_at', 'order__user__username', 'order__status',
+        'order__payment_method', 'order__payment_status', 'order__total_price',
+        'product_id', 'product__name', 'quantity', 'price',
+    )
+    for row in rows.iterator(chunk_size=chunk_size):
+        yield row + (row[-1] * row[-2],)
+
+def _archived_order_lines(start_at, end_at, chunk_size):
+    orders = ArchivedOrder.objects.all()
+    if start_at:
+        orders = orders.filter(created_at__gte=start_at)
+    if end_at:
+        orders = orders.filter(created_at__lt=end_at)
+    rows = orders.order_by('id').values_list(
+        'id', 'created_at', 'user__username', 'status', 'payment_method', 'payment_status', 'total_price', 'items',
+    )
+    for *order, items in rows.iterator(chunk_size=chunk_size):
+        for product_id, name, quantity, price in items:
+            price = Decimal(price)
+            yield (*order, product_id, name, quantity, price, price * quantity)
+
+# -------------------------
+# Streaming Encoders
+# -------------------------
+class _Echo:
+    """File-like object whose write() just hands the line back (for csv.writer)."""
+
+    def write(self, value):
+        return value
+
+def encode_rows(rows, fmt, columns, batch_size=500):
+    """Yield CSV or JSONL text for ``rows`` in batches of ``batch_size`` lines."""
+    if fmt == 'csv':
+        writer = csv.writer(_Echo())
+        encode = writer.writerow
+        yield encode(columns)
+    else:
+        def encode(row):
+            return json.dumps(dict(zip(columns, row)), default=str) + '\n'
+
+    batch = []
+    for row in rows:
+        batch.append(encode(row))
+        if len(batch) >= batch_size:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
+
+async def aiter_chunks(chunks):
+    """
+    Serve a sync chunk generator to an ASGI response without buffering it.
+
+    Each chunk is produced with sync_to_async(), so the database cursor
+    stays on the request's one sync thread and only one chunk is held in
+    memory at a time. The generator is closed if the client goes away.
+    """
+    done = object()
+    try:
+        while (chunk := await sync_to_async(next)(chunks, done)) is not done:
+            yield chunk
+    finally:
+        await sync_to_async(chunks.close)()
@@ -0,0 +1,94 @@
+import posixpath
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from . import catalog_cache
+from .tasks import task
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # Pillow is only needed to generate derivatives
+    Image = None
+
+# -------------------------
+# Image Derivatives
+# -------------------------
+# Each uploaded product image gets resized copies per preset and format,
+# stored under MEDIA_ROOT/derivatives/<preset>/ next to the original:
+#
+#   products/guppy.jpg -> derivatives/card/products/guppy-320.webp
+
+FORMATS = {
+    # format: (Pillow format name, file extension, MIME type, save options)
+    'avif': ('AVIF', 'avif', 'image/avif', {'quality': 50}),
+    'webp': ('WEBP', 'webp', 'image/webp', {'quality': 80, 'method': 6}),
+    'jpeg': ('JPEG', 'jpg', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+def available_formats():
+    """Derivative formats this Pillow build can encode, best compression first."""
+    if Image is None:
+        return []
+    formats = [f for f in settings.IMAGE_DERIVATIVE_FORMATS if f == 'jpeg' or features.check(f)]
+    return sorted(formats, key=list(FORMATS).index)
+
+def derivative_name(image_name, preset, width, fmt):
+    stem, _ = posixpath.splitext(image_name)
+    return f'derivatives/{preset}/{stem}-{width}.{FORMATS[fmt][1]}'
+
+def _resize(image, width, crop):
+    if crop:
+        return ImageOps.fit(image, (width, width), Image.LANCZOS)
+    height = round(image.height * width / image.width)
+    return image.resize((width, height), Image.LANCZOS)
+
+@task()
+def generate_derivatives(image_name, overwrite=False, product_id=None):
+    """
+    Write every preset/width/format derivative of a stored image.
+
+    Widths larger than the original are skipped rather than upscaled. When
+    anything was written for ``product_id``, its cached card and detail
+    fragments are invalidated so they pick up the new srcset. Returns the
+    names of the files written.
+    """
+    if Image is None or not image_name:
+        return []
+    with default_storage.open(image_name) as f:
+        original = ImageOps.exif_transpose(Image.open(f))
+        original.load()
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA' if 'A' in original.getbands() else 'RGB')
+
+    written = []
+    for preset, config in settings.IMAGE_DERIVATIVE_PRESETS.items():
+        for width in config['widths']:
+            if width > original.width:
+                continue
+            resized = None
+            for fmt in available_formats():
+                name = derivative_name(image_name, preset, width, fmt)
+                if not overwrite and default_storage.exists(name):
+                    continue
+                if resized is None:
+                    resized = _resize(original, width, config['crop'])
+                pil_format, _, _, options = FORMATS[fmt]
+                image = resized.convert('RGB') if fmt == 'jpeg' else resized
+                buffer = BytesIO()
+                image.save(buffer, pil_format, **options)
+                if default_storage.exists(name):
+                    default_storage.delete(name)
+                written.append(default_storage.save(name, ContentFile(buffer.getvalue())))
+    if written and product_id is not None:
+        catalog_cache.bump('product', product_id)
+    return written
+
+def derivative_widths(image_name, preset):
+    """Widths of ``preset`` that have been generated for the image (checked on the JPEG fallback)."""
+    return [
+        width for width in settings.IMAGE_DERIVATIVE_PRESETS[preset]['widths']
+        if default_storage.exists(derivative_name(image_name, preset, width, 'jpeg'))
+    ]
@@ -0,0 +1,111 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import StockHold
+
+# -------------------------
+# Stock Holds
+# -------------------------
+# Carts reserve stock with one StockHold row per (product, owner) instead of
+# touching the Product row, so a flash sale spreads its writes over many
+# small rows and only checkout ever locks the product itself. The
+# a-prefixed functions run the same queries on the async ORM.
+
+def _hold_expiry():
+    return timezone.now() + timedelta(seconds=settings.STOCK_HOLD_TTL)
+
+def _held_rows(product_ids, exclude_owner):
+    holds = StockHold.objects.filter(product_id__in=product_ids, expires_at__gt=timezone.now())
+    if exclude_owner:
+        holds = holds.exclude(owner=exclude_owner)
+    return holds.values('product_id').annotate(held=Sum('quantity')).values_list('product_id', 'held')
+
+def held_quantities(product_ids, exclude_owner=None):
+    """Return {product_id: quantity} currently held by active reservations."""
+    return dict(_held_rows(product_ids, exclude_owner))
+
+def available_quantities(products, owner=None):
+    """
+    Return {product_id: stock - active holds} for the given products.
+
+    Holds belonging to ``owner`` are not subtracted, so a cart always sees
+    the stock it has already reserved as available to itself.
+    """
+    held = held_quantities([p.id for p in products], exclude_owner=owner)
+    return {p.id: max(p.stock - held.get(p.id, 0), 0) for p in products}
+
+def available_quantity(product, owner=None):
+    return available_quantities([product], owner)[product.id]
+
+async def aheld_quantities(product_ids, exclude_owner=None):
+    return {product_id: held async for product_id, held in _held_rows(product_ids, exclude_owner)}
+
+async def aavailable_quantities(products, owner=None):
+    held = await aheld_quantities([p.id for p in products], exclude_owner=owner)
+    return {p.id: max(p.stock - held.get(p.id, 0), 0) for p in products}
+
+def hold(owner, product_id, quantity):
+    """Set the quantity ``owner`` holds for a product, releasing it at zero."""
+    if quantity <= 0:
+        release(owner, [product_id])
+        return
+    StockHold.objects.update_or_create(
+        product_id=product_id,
+        owner=owner,
+        defaults={'quantity': quantity, 'expires_at': _hold_expiry()},
+    )
+
+def _hold_upserts(owner, quantities):
+    expires_at = _hold_expiry()
+    return [
+        StockHold(product_id=product_id, owner=owner, quantity=quantity, expires_at=expires_at)
+        for product_id, quantity in quantities.items() if quantity > 0
+    ]
+
+async def aset_holds(owner, quantities):
+    """
+    Set the holds of several products at once: one upsert for the positive
+    quantities and one delete for the zeros, however many lines change.
+    """
+    upserts = _hold_upserts(owner, quantities)
+    if upserts:
+        await StockHold.objects.abulk_create(
+            upserts,
+            update_conflicts=True,
+            unique_fields=['product', 'owner'],
+            update_fields=['quantity', 'expires_at'],
+        )
+    released = [product_id for product_id, quantity in quantities.items() if quantity <= 0]
+    if released:
+        await arelease(owner, released)
+
+def _owner_holds(owner, product_ids):
+    holds = StockHold.objects.filter(owner=owner)
+    if product_ids is not None:
+        holds = holds.filter(product_id__in=product_ids)
+    return holds
+
+def release(owner, product_ids=None):
+    _owner_holds(owner, product_ids).delete()
+
+async def arelease(owner, product_ids=None):
+    await _owner_holds(owner, product_ids).adelete()
+
+def transfer(old_owner, new_owner):
+    """
+    Move holds to a new owner, e.g. when an anonymous cart is merged at login.
+
+    The moved holds replace the new owner's holds on the same products.
+    """
+    if old_owner and new_owner and old_owner != new_owner:
+        moved = StockHold.objects.filter(owner=old_owner)
+        StockHold.objects.filter(owner=new_owner, product_id__in=moved.values('product_id')).delete()
+        moved.update(owner=new_owner)
+
+def sweep_expired():
+    """Delete expired holds and return how many were removed."""
+    deleted, _ = StockHold.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from main import archive
+
+
+class Command(BaseCommand):
+    help = (
+        "Move delivered orders older than --months into the archive table, "
+        "one batch per transaction. Safe to stop and rerun."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=settings.ORDER_ARCHIVE_MONTHS)
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true', help="Only count the orders that would move.")
+
+    def handle(self, *args, **options):
+        if options['months'] < 1:
+            raise CommandError("--months must be at least 1.")
+        cutoff = archive.months_ago(options['months'])
+        if options['dry_run']:
+            count = archive.archivable(cutoff).count()
+            self.stdout.write(f"{count} delivered order(s) created before {cutoff:%Y-%m-%d} would be archived.")
+            return
+
+        total = 0
+        for moved in archive.archive_orders(cutoff, options['batch_size']):
+            total += moved
+            if options['verbosity'] > 1:
+                self.stdout.write(f"Archived {total} order(s)...")
+        if total:
+            archive.refresh_statistics()
+        self.stdout.write(self.style.SUCCESS(f"Archived {total} order(s) created before {cutoff:%Y-%m-%d}."))
@@ -0,0 +1,43 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+from main import archive, rollups
+from main.models import Order
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily sales rollups from orders for a range of days."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help="First day (YYYY-MM-DD); defaults to the first order.")
+        parser.add_argument('--end', help="Last day (YYYY-MM-DD); defaults to today.")
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        try:
+            start = date.fromisoformat(options['start']) if options['start'] else None
+            end = date.fromisoformat(options['end']) if options['end'] else timezone.localdate()
+        except ValueError as e:
+            raise CommandError(f"Invalid date: {e}")
+        if start is None:
+            first = Order.objects.aggregate(first=Min('created_at'))['first']
+            if first is None:
+                self.stdout.write("No orders to roll up.")
+                return
+            start = timezone.localdate(first)
+
+        # Archived orders are no longer in the order tables, so rebuilding a
+        # day they belong to would drop their sales from the rollups.
+        horizon = archive.archive_horizon()
+        if horizon and start <= horizon:
+            raise CommandError(
+                f"Orders up to {horizon} have been archived; backfill from {horizon + timedelta(days=1)} onwards."
+            )
+
+        product_rows, payment_rows = rollups.backfill(start, end, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rolled up {start} to {end}: {product_rows} product-day and {payment_rows} payment-day rows."
+        ))
@@ -0,0 +1,117 @@
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+
+from main.benchmark import percentile
+from main.models import Product
+
+AJAX = {'x-requested-with': 'XMLHttpRequest'}
+
+
+class ThreadSampler:
+    """Record the highest number of live threads while the block runs."""
+
+    def __init__(self):
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(0.005):
+            self.peak = max(self.peak, threading.active_count() - 1)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the cart AJAX endpoints served the WSGI way (a worker with a "
+        "fixed thread pool) and the ASGI way (one event loop) in-process. "
+        "Run seed_store first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shoppers', type=int, default=200)
+        parser.add_argument('--clicks', type=int, default=5, help="add_to_cart clicks per shopper.")
+        parser.add_argument('--threads', type=int, default=4, help="Threads of the WSGI worker.")
+        parser.add_argument('--concurrency', type=int, default=64, help="Shoppers in flight at once.")
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        product_ids = list(Product.objects.filter(stock__gte=100000).values_list('id', flat=True)[:1000])
+        if len(product_ids) < options['clicks']:
+            raise CommandError("Not enough stocked products; run `manage.py seed_store` first.")
+        rng = random.Random(options['seed'])
+        carts = [rng.sample(product_ids, options['clicks']) for _ in range(options['shoppers'])]
+
+        with override_settings(ALLOWED_HOSTS=['*'], DEBUG=False):
+            results = [
+                ('WSGI', options['threads'], self.run_wsgi(carts, options['threads'])),
+                ('ASGI', options['concurrency'], self.run_asgi(carts, options['concurrency'])),
+            ]
+
+        self.stdout.write(f"{'mode':<6}{'in flight':>10}{'clicks/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'threads':>9}")
+        for mode, in_flight, (latencies, elapsed, peak_threads) in results:
+            self.stdout.write(
+                f"{mode:<6}{in_flight:>10}{len(latencies) / elapsed:>10.1f}"
+                + ''.join(f"{percentile(latencies, p) * 1000:>9.1f}" for p in (50, 95, 99))
+                + f"{peak_threads:>9}"
+            )
+
+    def run_wsgi(self, carts, threads):
+        def shop(product_ids):
+            client, latencies = Client(SERVER_NAME='localhost'), []
+            try:
+                for product_id in product_ids:
+                    start = time.perf_counter()
+                    response = client.get(reverse('add_to_cart', args=[product_id]), headers=AJAX)
+                    latencies.append(time.perf_counter() - start)
+                    self.check_response(response)
+            finally:
+                connections.close_all()
+            return latencies
+
+        with ThreadSampler() as sampler:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                latencies = [value for shopper in pool.map(shop, carts) for value in shopper]
+            elapsed = time.perf_counter() - start
+        return latencies, elapsed, sampler.peak
+
+    def run_asgi(self, carts, concurrency):
+        async def shop(product_ids, slots):
+            async with slots:
+                client, latencies = AsyncClient(SERVER_NAME='localhost'), []
+                for product_id in product_ids:
+                    start = time.perf_counter()
+                    response = await client.get(reverse('add_to_cart', args=[product_id]), headers=AJAX)
+                    latencies.append(time.perf_counter() - start)
+                    self.check_response(response)
+                return latencies
+
+        async def run():
+            slots = asyncio.Semaphore(concurrency)
+            return await asyncio.gather(*(shop(product_ids, slots) for product_ids in carts))
+
+        with ThreadSampler() as sampler:
+            start = time.perf_counter()
+            latencies = [value for shopper in asyncio.run(run()) for value in shopper]
+            elapsed = time.perf_counter() - start
+        return latencies, elapsed, sampler.peak
+
+    def check_response(self, response):
+        if response.status_code != 200 or not response.json()['success']:
+            raise CommandError(f"add_to_cart failed with status {response.status_code}")
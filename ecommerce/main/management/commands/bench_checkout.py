@@ -0,0 +1,77 @@
+import random
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+
+from main.benchmark import percentile
+from main.models import Product
+from main.orders import place_order, OutOfStock
+
+
+class Command(BaseCommand):
+    help = (
+        "Run concurrent checkouts against the configured database and report "
+        "throughput, latency percentiles and failures. Run seed_store first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--checkouts', type=int, default=50, help="Checkouts per thread.")
+        parser.add_argument('--cart-size', type=int, default=3)
+        parser.add_argument('--hot-products', type=int, default=20,
+                            help="Size of the product pool carts draw from; smaller means more contention.")
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        product_ids = list(
+            Product.objects.filter(stock__gte=100000).order_by('id').values_list('id', flat=True)[:options['hot_products']]
+        )
+        if len(product_ids) < options['cart_size']:
+            raise CommandError("Not enough stocked products; run `manage.py seed_store` first.")
+        user, _ = User.objects.get_or_create(username='bench-shopper')
+
+        latencies, errors = [], {}
+        lock = threading.Lock()
+
+        def worker(index):
+            rng = random.Random(options['seed'] + index)
+            local_latencies, local_errors = [], {}
+            try:
+                for _ in range(options['checkouts']):
+                    cart = {str(pid): rng.randint(1, 3) for pid in rng.sample(product_ids, options['cart_size'])}
+                    start = time.perf_counter()
+                    try:
+                        place_order(user, cart, 'Cash')
+                    except (DatabaseError, OutOfStock) as e:
+                        name = type(e).__name__
+                        local_errors[name] = local_errors.get(name, 0) + 1
+                        continue
+                    local_latencies.append(time.perf_counter() - start)
+            finally:
+                connection.close()
+            with lock:
+                latencies.extend(local_latencies)
+                for name, count in local_errors.items():
+                    errors[name] = errors.get(name, 0) + count
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(options['threads'])]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        db = connection.settings_dict
+        self.stdout.write(f"Backend:     {connection.vendor} ({db['NAME']}, options: {db.get('OPTIONS') or {}})")
+        self.stdout.write(f"Threads:     {options['threads']} x {options['checkouts']} checkouts")
+        self.stdout.write(f"Completed:   {len(latencies)} in {elapsed:.2f}s ({len(latencies) / elapsed:.1f} checkouts/s)")
+        self.stdout.write(
+            "Latency:     p50 {:.1f} ms, p95 {:.1f} ms, p99 {:.1f} ms".format(
+                *(percentile(latencies, p) * 1000 for p in (50, 95, 99))
+            )
+        )
+        self.stdout.write(f"Failures:    {errors or 'none'}")
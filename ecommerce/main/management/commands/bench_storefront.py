@@ -0,0 +1,76 @@
+import platform
+import random
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from main.benchmark import FlowRecorder, format_report, load_results, save_results
+from main.models import Product
+
+AJAX = {'x-requested-with': 'XMLHttpRequest'}
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive the storefront flows in-process through the Django test client and "
+        "report throughput, latency percentiles and query counts. Run seed_store first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50, help="Shopping sessions to simulate.")
+        parser.add_argument('--cart-size', type=int, default=5, help="add_to_cart clicks per session.")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help="Save the results as a JSON baseline to this path.")
+        parser.add_argument('--compare', help="Compare against a JSON baseline saved earlier with --output.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        product_ids = list(Product.objects.filter(stock__gte=1000).values_list('id', flat=True)[:10000])
+        if len(product_ids) < options['cart_size']:
+            raise CommandError("Not enough stocked products; run `manage.py seed_store` first.")
+
+        user, _ = User.objects.get_or_create(username='bench-shopper')
+        client = Client(SERVER_NAME='localhost')
+        client.force_login(user)
+        recorder = FlowRecorder()
+
+        with override_settings(ALLOWED_HOSTS=['*'], DEBUG=False):
+            for _ in range(options['iterations']):
+                self.run_session(client, recorder, rng, product_ids, options['cart_size'])
+
+        summary = recorder.summary()
+        baseline = load_results(options['compare']) if options['compare'] else None
+        self.stdout.write(format_report(summary, baseline))
+
+        if options['output']:
+            save_results(options['output'], summary, {
+                'created_at': timezone.now().isoformat(),
+                'iterations': options['iterations'],
+                'cart_size': options['cart_size'],
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'products': Product.objects.count(),
+            })
+            self.stdout.write(f"Saved results to {options['output']}.")
+
+    def request(self, client, recorder, flow, method, url, expected=(200,), **kwargs):
+        with recorder.measure(flow):
+            response = getattr(client, method)(url, **kwargs)
+        if response.status_code not in expected:
+            raise CommandError(f"{flow}: {method.upper()} {url} returned {response.status_code}")
+        return response
+
+    def run_session(self, client, recorder, rng, product_ids, cart_size):
+        self.request(client, recorder, 'home', 'get', reverse('home'))
+        picks = rng.sample(product_ids, cart_size)
+        for product_id in picks:
+            self.request(client, recorder, 'product_detail', 'get', reverse('product_detail', args=[product_id]))
+        for product_id in picks:
+            self.request(client, recorder, 'add_to_cart', 'get', reverse('add_to_cart', args=[product_id]), headers=AJAX)
+        self.request(client, recorder, 'cart', 'get', reverse('cart'))
+        self.request(client, recorder, 'checkout', 'post', reverse('checkout'), expected=(302,), data={'payment_method': 'Cash'})
+        self.request(client, recorder, 'profile', 'get', reverse('profile'))
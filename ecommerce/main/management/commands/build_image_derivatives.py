@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from main import images
+from main.models import Product
+
+
+class Command(BaseCommand):
+    help = "Generate thumbnail and WebP/AVIF derivatives for product images."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Regenerate derivatives that already exist.")
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(image='').exclude(image__isnull=True).only('id', 'image')
+        processed = written = 0
+        for product in products.iterator(chunk_size=500):
+            names = images.generate_derivatives(product.image.name, overwrite=options['force'], product_id=product.id)
+            written += len(names)
+            processed += 1
+        self.stdout.write(f"Processed {processed} image(s), wrote {written} derivative file(s).")
@@ -0,0 +1,40 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.catalog_io import CATALOG_COLUMNS, detect_format, Progress, RowWriter
+from main.models import Product
+
+
+class Command(BaseCommand):
+    help = "Stream the catalog to a CSV or JSONL file without loading it into memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help="Output file, or - for stdout (default).")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Defaults to the file extension, else csv.")
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--progress-every', type=int, default=100000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = detect_format(path, options['format'])
+        rows = (
+            Product.objects.order_by('id')
+            .values_list('id', 'name', 'price', 'description', 'stock', 'category__name', 'image')
+            .iterator(chunk_size=options['chunk_size'])
+        )
+        progress = Progress(self.stderr.write, options['progress_every'])
+
+        try:
+            f = sys.stdout if path == '-' else open(path, 'w', newline='', encoding='utf-8')
+        except OSError as e:
+            raise CommandError(e)
+        try:
+            writer = RowWriter(f, fmt, CATALOG_COLUMNS)
+            for row in rows:
+                writer.write(row)
+                progress.add()
+        finally:
+            if f is not sys.stdout:
+                f.close()
+        progress.report('products exported')
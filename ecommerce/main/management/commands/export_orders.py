@@ -0,0 +1,42 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.catalog_io import detect_format, Progress
+from main.exports import ORDER_LINE_COLUMNS, encode_rows, order_lines, parse_date_range
+
+
+class Command(BaseCommand):
+    help = "Stream order lines with payment details to CSV or JSONL for finance."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help="Output file, or - for stdout (default).")
+        parser.add_argument('--start', help="First day to include (YYYY-MM-DD).")
+        parser.add_argument('--end', help="Last day to include (YYYY-MM-DD).")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Defaults to the file extension, else csv.")
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        try:
+            start_at, end_at = parse_date_range(options['start'], options['end'])
+        except ValueError as e:
+            raise CommandError(f"Invalid date: {e}")
+
+        progress = Progress(self.stderr.write, every=100000)
+
+        def counted(rows):
+            for row in rows:
+                progress.add()
+                yield row
+
+        lines = order_lines(start_at, end_at, options['chunk_size'])
+        chunks = encode_rows(counted(lines), detect_format(path, options['format']), ORDER_LINE_COLUMNS)
+        f = sys.stdout if path == '-' else open(path, 'w', newline='', encoding='utf-8')
+        try:
+            for chunk in chunks:
+                f.write(chunk)
+        finally:
+            if f is not sys.stdout:
+                f.close()
+        progress.report('order lines exported')
@@ -0,0 +1,95 @@
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from main import catalog_cache, search
+from main.catalog_io import detect_format, parse_product_row, read_rows, Progress
+from main.models import Category, Product
+
+UPDATE_FIELDS = ['name', 'price', 'description', 'stock', 'category', 'image', 'updated_at']
+
+
+class Command(BaseCommand):
+    help = "Stream a CSV or JSONL catalog file into Product rows, upserting in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Defaults to the file extension.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--progress-every', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        fmt = detect_format(options['path'], options['format'])
+        self.categories = dict(Category.objects.values_list('name', 'id'))
+        self.skipped = 0
+        progress = Progress(self.stderr.write, options['progress_every'])
+
+        try:
+            f = open(options['path'], newline='', encoding='utf-8')
+        except OSError as e:
+            raise CommandError(e)
+        with f:
+            rows = read_rows(f, fmt)
+            line = 0
+            while batch := list(islice(rows, options['batch_size'])):
+                self.import_batch(batch, first_line=line + 1)
+                line += len(batch)
+                progress.add(len(batch))
+
+        # Updated rows may have changed category, so refresh every category page.
+        for category_id in self.categories.values():
+            catalog_cache.bump_category(category_id)
+        progress.report()
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {progress.count - self.skipped} product(s), skipped {self.skipped}."
+        ))
+
+    def resolve_categories(self, names):
+        missing = {n for n in names if n not in self.categories}
+        if missing:
+            created = Category.objects.bulk_create([Category(name=n) for n in sorted(missing)])
+            self.categories.update((c.name, c.id) for c in created)
+
+    def reset_id_sequence(self):
+        """Move the id sequence past explicit ids, so inserts without one don't collide (PostgreSQL)."""
+        statements = connection.ops.sequence_reset_sql(no_style(), [Product])
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+
+    def import_batch(self, batch, first_line):
+        parsed = []
+        for offset, raw in enumerate(batch):
+            try:
+                parsed.append(parse_product_row(raw))
+            except (KeyError, ValueError, ArithmeticError) as e:
+                self.skipped += 1
+                self.stderr.write(f"Record {first_line + offset}: skipped ({e})")
+
+        with transaction.atomic():
+            self.resolve_categories({row['category'] for row in parsed})
+            # PostgreSQL refuses an upsert that touches the same row twice,
+            # so the last record for an id in the batch wins.
+            with_id, without_id = {}, []
+            for row in parsed:
+                product = Product(category_id=self.categories[row.pop('category')], **row)
+                if product.id is not None:
+                    with_id[product.id] = product
+                else:
+                    without_id.append(product)
+            with_id = list(with_id.values())
+
+            if with_id:
+                Product.objects.bulk_create(
+                    with_id, update_conflicts=True, unique_fields=['id'], update_fields=UPDATE_FIELDS,
+                )
+                self.reset_id_sequence()
+            created = Product.objects.bulk_create(without_id)
+
+            # bulk_create() skips model signals, so keep the search index in step here.
+            search.index_products([p.id for p in with_id + created if p.id is not None])
+        for product in with_id:
+            catalog_cache.bump('product', product.id)
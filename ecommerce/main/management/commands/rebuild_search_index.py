@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from main import search
+from main.models import Product
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product full-text search index from scratch."
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            raise CommandError("The full-text index is only available on SQLite.")
+        search.rebuild()
+        self.stdout.write(f"Indexed {Product.objects.count()} product(s).")
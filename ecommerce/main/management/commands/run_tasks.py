@@ -0,0 +1,43 @@
+import os
+import signal
+import socket
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from main import tasks
+
+
+class Command(BaseCommand):
+    help = "Run queued background tasks, continuously or until the queue is drained."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help="Tasks claimed per batch (default: TASK_BATCH_SIZE).")
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds to sleep when the queue is empty.")
+        parser.add_argument('--once', action='store_true', help="Drain the due tasks and exit.")
+
+    def handle(self, *args, **options):
+        worker = f'{socket.gethostname()}:{os.getpid()}'
+        if options['once']:
+            tasks.release_stale()
+            self.stdout.write(f"Ran {tasks.run_pending(worker)} task(s).")
+            return
+
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        self.stdout.write(f"Worker {worker} started.")
+        last_release = 0
+        while not self.stopping:
+            close_old_connections()
+            if time.monotonic() - last_release > 60:
+                tasks.release_stale()
+                last_release = time.monotonic()
+            if not tasks.run_batch(worker, options['batch_size']):
+                time.sleep(options['interval'])
+        self.stdout.write(f"Worker {worker} stopped.")
+
+    def stop(self, signum, frame):
+        # Finish the batch in hand, then exit.
+        self.stopping = True
@@ -0,0 +1,94 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from main import catalog_cache, search
+from main.models import Category, Product, Order, OrderItem
+
+WORDS = (
+    'guppy molly platy tetra danio betta gourami cichlid pleco loach barb rasbora '
+    'snail shrimp plant moss fern java anubias amazon sword tank filter heater '
+    'yellow blue red neon golden albino fancy dwarf giant wild premium'
+).split()
+
+
+class Command(BaseCommand):
+    help = "Fill the database with synthetic catalog, users and order history for benchmarking."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--products', type=int, default=5000)
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--orders', type=int, default=10000)
+        parser.add_argument('--items-per-order', type=int, default=3)
+        parser.add_argument('--days', type=int, default=365, help="Spread order history over this many days.")
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=42, help="Random seed, for reproducible datasets.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+
+        with transaction.atomic():
+            categories = Category.objects.bulk_create(
+                [Category(name=f'Category {i}') for i in range(options['categories'])],
+                batch_size=batch_size,
+            )
+            self.stdout.write(f"Created {len(categories)} categories.")
+
+            products = []
+            for start in range(0, options['products'], batch_size):
+                products += Product.objects.bulk_create([
+                    Product(
+                        name=' '.join(rng.choices(WORDS, k=3)).title(),
+                        price=Decimal(rng.randint(50, 50000)) / 100,
+                        description=' '.join(rng.choices(WORDS, k=40)),
+                        stock=1_000_000,
+                        category=rng.choice(categories),
+                    )
+                    for _ in range(start, min(start + batch_size, options['products']))
+                ])
+            self.stdout.write(f"Created {len(products)} products.")
+
+            # One hash for everyone: hashing per user would dominate seeding time.
+            password = make_password('benchmark')
+            run = rng.getrandbits(32)
+            users = User.objects.bulk_create(
+                [User(username=f'bench-{run:x}-{i}', password=password) for i in range(options['users'])],
+                batch_size=batch_size,
+            )
+            self.stdout.write(f"Created {len(users)} users (password: 'benchmark').")
+
+            now = timezone.now()
+            created = 0
+            while created < options['orders'] and users and products:
+                count = min(batch_size, options['orders'] - created)
+                orders = Order.objects.bulk_create([
+                    Order(user=rng.choice(users), payment_method='Cash', payment_status='Paid', status='Delivered')
+                    for _ in range(count)
+                ])
+                items = []
+                for order in orders:
+                    order.created_at = now - timedelta(seconds=rng.randint(0, options['days'] * 86400))
+                    lines = [
+                        OrderItem(order=order, product=product, quantity=rng.randint(1, 3), price=product.price)
+                        for product in rng.sample(products, min(options['items_per_order'], len(products)))
+                    ]
+                    order.total_price = sum((i.price * i.quantity for i in lines), Decimal('0'))
+                    items += lines
+                Order.objects.bulk_update(orders, ['created_at', 'total_price'])
+                OrderItem.objects.bulk_create(items, batch_size=batch_size)
+                created += count
+            self.stdout.write(f"Created {created} orders.")
+
+        # bulk_create() skips model signals, so refresh derived data by hand.
+        search.rebuild()
+        for category in categories:
+            catalog_cache.bump_category(category.id)
+        self.stdout.write(self.style.SUCCESS("Seeding complete."))
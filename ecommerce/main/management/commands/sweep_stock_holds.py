@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main import cart, inventory
+
+
+class Command(BaseCommand):
+    help = "Delete expired stock holds and abandoned saved carts, once or continuously in the background."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=int, default=0,
+            help="Keep running and sweep every N seconds (default: sweep once and exit).",
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        while True:
+            deleted = inventory.sweep_expired()
+            carts = cart.sweep_saved_carts()
+            if deleted or carts or not interval:
+                self.stdout.write(f"Removed {deleted} expired stock hold(s) and {carts} abandoned cart(s).")
+            if not interval:
+                break
+            time.sleep(interval)
@@ -0,0 +1,41 @@
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from main.db_routing import PRIMARY, REPLICA
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database over the replica file, standing in "
+        "for replication when running the primary/replica layout locally."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help="Keep running and copy every N seconds (default: copy once and exit).",
+        )
+
+    def handle(self, *args, **options):
+        if REPLICA not in connections.settings:
+            raise CommandError("No replica configured; set DJANGO_DB_REPLICA.")
+        primary, replica = connections[PRIMARY], connections[REPLICA]
+        if primary.vendor != 'sqlite' or replica.vendor != 'sqlite':
+            raise CommandError("sync_replica only copies SQLite files; use real replication elsewhere.")
+
+        interval = options['interval']
+        while True:
+            replica.close()
+            primary.ensure_connection()
+            target = sqlite3.connect(replica.settings_dict['NAME'])
+            try:
+                primary.connection.backup(target)
+            finally:
+                target.close()
+            if not interval:
+                self.stdout.write("Replica is up to date.")
+                break
+            time.sleep(interval)
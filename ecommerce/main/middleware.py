@@ -0,0 +1,336 @@
+import json
+import logging
+import mimetypes
+import os
+import threading
+import time
+from contextvars import ContextVar
+from urllib.parse import urlsplit
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import FileResponse
+from django.template.backends.django import Template as DjangoTemplate
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from . import db_routing
+from .cart import flush_cart, aflush_cart
+
+logger = logging.getLogger(__name__)
+
+# -------------------------
+# Per-request Profile
+# -------------------------
+class RequestProfile:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - start
+
+_current_profile = ContextVar('request_profile', default=None)
+
+def _profile_queries(execute, sql, params, many, context):
+    profile = _current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    return profile.execute_wrapper(execute, sql, params, many, context)
+
+def _install_query_profiler(connection, **kwargs):
+    if _profile_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_profile_queries)
+
+def _install_query_profilers():
+    """
+    Count queries on every connection, in whichever thread runs them.
+
+    Async views run their ORM calls on sync_to_async worker threads, each with
+    its own connections; the wrapper finds the request's profile through the
+    context variable, which sync_to_async carries into those threads.
+    """
+    connection_created.connect(_install_query_profiler, dispatch_uid='query_profiler')
+    for connection in connections.all(initialized_only=True):
+        _install_query_profiler(connection)
+
+def _install_template_timer():
+    """Wrap template rendering once so top-level render time is attributed to the request."""
+    if getattr(DjangoTemplate.render, 'profiled', False):
+        return
+    original = DjangoTemplate.render
+
+    def render(self, context=None, request=None):
+        profile = _current_profile.get()
+        if profile is None:
+            return original(self, context, request)
+        start = time.perf_counter()
+        try:
+            return original(self, context, request)
+        finally:
+            profile.template_time += time.perf_counter() - start
+
+    render.profiled = True
+    DjangoTemplate.render = render
+
+# -------------------------
+# Aggregated View Stats
+# -------------------------
+class ViewStats:
+    FIELDS = ('requests', 'queries', 'db_time', 'template_time', 'wall_time')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def record(self, view_name, profile, wall_time):
+        with self._lock:
+            stats = self._views.setdefault(view_name, dict.fromkeys(self.FIELDS, 0))
+            stats['requests'] += 1
+            stats['queries'] += profile.queries
+            stats['db_time'] += profile.db_time
+            stats['template_time'] += profile.template_time
+            stats['wall_time'] += wall_time
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(stats) for name, stats in self._views.items()}
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+    def as_prometheus(self):
+        metrics = [
+            ('view_requests_total', 'counter', 'requests'),
+            ('view_db_queries_total', 'counter', 'queries'),
+            ('view_db_seconds_total', 'counter', 'db_time'),
+            ('view_template_seconds_total', 'counter', 'template_time'),
+            ('view_wall_seconds_total', 'counter', 'wall_time'),
+        ]
+        snapshot = self.snapshot()
+        lines = []
+        for metric, kind, field in metrics:
+            lines.append(f'# TYPE {metric} {kind}')
+            for name, stats in sorted(snapshot.items()):
+                lines.append(f'{metric}{{view="{name}"}} {stats[field]}')
+        return '\n'.join(lines) + '\n'
+
+view_stats = ViewStats()
+
+# -------------------------
+# Middleware
+# -------------------------
+class _SyncAndAsyncMiddleware:
+    """
+    Base for middleware that runs natively under both WSGI and ASGI.
+
+    Subclasses implement ``call(request)`` and ``acall(request)``; an async
+    view behind async-capable middleware never needs a thread of its own.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.acall(request)
+        return self.call(request)
+
+class QueryProfileMiddleware(_SyncAndAsyncMiddleware):
+    """
+    Measure query count, DB time, template time and wall time per request.
+
+    Numbers are added to the response as a Server-Timing header, aggregated
+    per URL name in ``view_stats``, and a warning is logged whenever a GET
+    request exceeds its view's entry in ``settings.VIEW_QUERY_BUDGETS``.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        _install_template_timer()
+        _install_query_profilers()
+
+    def call(self, request):
+        profile = RequestProfile()
+        token = _current_profile.set(profile)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+        return self._report(request, response, profile, time.perf_counter() - start)
+
+    async def acall(self, request):
+        profile = RequestProfile()
+        token = _current_profile.set(profile)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+        return self._report(request, response, profile, time.perf_counter() - start)
+
+    def _report(self, request, response, profile, wall_time):
+        match = request.resolver_match
+        view_name = match.view_name if match else 'unresolved'
+        view_stats.record(view_name, profile, wall_time)
+
+        budget = settings.VIEW_QUERY_BUDGETS.get(view_name) if request.method == 'GET' else None
+        if budget is not None and profile.queries > budget:
+            logger.warning(
+                "%s ran %d queries, over its budget of %d", view_name, profile.queries, budget,
+            )
+
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={profile.db_time * 1000:.2f};desc="{profile.queries} queries"',
+            f'tpl;dur={profile.template_time * 1000:.2f}',
+            f'total;dur={wall_time * 1000:.2f}',
+        ])
+        return response
+
+class ReadYourWritesMiddleware(_SyncAndAsyncMiddleware):
+    """
+    Keep a visitor's reads on the primary for a short while after they write.
+
+    A request that writes a replicated model sets a cookie that pins the
+    visitor's following requests to the primary for
+    ``settings.READ_YOUR_WRITES_SECONDS``, long enough for the replica to
+    catch up, so they always see their own orders and edits.
+    """
+
+    cookie_name = 'pin_primary'
+
+    def call(self, request):
+        with db_routing.request_scope(pinned=self.cookie_name in request.COOKIES):
+            return self._pin(self.get_response(request))
+
+    async def acall(self, request):
+        with db_routing.request_scope(pinned=self.cookie_name in request.COOKIES):
+            return self._pin(await self.get_response(request))
+
+    def _pin(self, response):
+        if db_routing.has_written():
+            response.set_cookie(
+                self.cookie_name, '1',
+                max_age=settings.READ_YOUR_WRITES_SECONDS,
+                httponly=True, samesite='Lax',
+            )
+        return response
+
+class CartMiddleware(_SyncAndAsyncMiddleware):
+    """Write the visitor's cart back to the cart store once, after the view."""
+
+    def call(self, request):
+        return flush_cart(request, self.get_response(request))
+
+    async def acall(self, request):
+        return await aflush_cart(request, await self.get_response(request))
+
+class StaticFilesMiddleware(_SyncAndAsyncMiddleware):
+    """
+    Serve collected static files from ``settings.STATIC_ROOT``.
+
+    Content-hashed names from the staticfiles manifest never change, so they
+    are cached for a year as immutable; anything else is revalidated with
+    an ETag after a minute. The ``.br``/``.gz`` variants written by
+    collectstatic are sent to browsers that accept them. Only files found in
+    STATIC_ROOT when the index is built are served; other paths fall
+    through to the URL resolver.
+    """
+
+    max_age = 60
+    immutable_max_age = 365 * 24 * 60 * 60
+    encodings = (('br', '.br'), ('gzip', '.gz'))
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.prefix = urlsplit(settings.STATIC_URL or '').path
+        self._lock = threading.Lock()
+        self._index = None
+
+    def call(self, request):
+        return self._serve(request) or self.get_response(request)
+
+    async def acall(self, request):
+        return self._serve(request) or await self.get_response(request)
+
+    def _files(self):
+        """Map every file under STATIC_ROOT to its path, size, mtime and whether it is hashed."""
+        root = settings.STATIC_ROOT
+        with self._lock:
+            if self._index is None or self._index[0] != root:
+                self._index = (root, self._scan(root) if root else {})
+            return self._index[1]
+
+    def _scan(self, root):
+        root = os.fspath(root)
+        try:
+            with open(os.path.join(root, 'staticfiles.json')) as f:
+                hashed = set(json.load(f).get('paths', {}).values())
+        except (OSError, ValueError):
+            hashed = set()
+        files = {}
+        for directory, _, names in os.walk(root):
+            for filename in names:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, root).replace(os.sep, '/')
+                stat = os.stat(path)
+                files[name] = (path, stat.st_size, stat.st_mtime, name in hashed)
+        return files
+
+    def _serve(self, request):
+        if not self.prefix or request.method not in ('GET', 'HEAD'):
+            return None
+        if not request.path_info.startswith(self.prefix):
+            return None
+        files = self._files()
+        name = request.path_info[len(self.prefix):]
+        if name not in files:
+            return None
+        path, size, mtime, immutable = files[name]
+
+        if not immutable:
+            etag = f'"{int(mtime):x}-{size:x}"'
+            response = get_conditional_response(request, etag=etag, last_modified=int(mtime))
+            if response is not None:
+                return self._finish(response, immutable)
+
+        encoding = None
+        accepted = request.headers.get('Accept-Encoding', '')
+        for coding, suffix in self.encodings:
+            if coding in accepted and name + suffix in files:
+                encoding, path = coding, files[name + suffix][0]
+                break
+
+        content_type, _ = mimetypes.guess_type(name)
+        response = FileResponse(open(path, 'rb'), content_type=content_type or 'application/octet-stream')
+        # FileResponse adds an inline filename, which would name the .gz variant.
+        del response['Content-Disposition']
+        if encoding:
+            response['Content-Encoding'] = encoding
+        if not immutable:
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(mtime)
+        return self._finish(response, immutable)
+
+    def _finish(self, response, immutable):
+        if immutable:
+            response['Cache-Control'] = f'public, max-age={self.immutable_max_age}, immutable'
+        else:
+            response['Cache-Control'] = f'public, max-age={self.max_age}'
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
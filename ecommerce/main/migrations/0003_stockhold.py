@@ -0,0 +1,28 @@
+# Generated by Django 5.1.15 on 2026-10-18 04:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0002_order_payment_method_order_payment_status_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('owner', models.CharField(max_length=64)),
+                ('quantity', models.PositiveIntegerField()),
+                ('expires_at', models.DateTimeField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holds', to='main.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'expires_at'], name='stockhold_product_expiry_idx'), models.Index(fields=['expires_at'], name='stockhold_expiry_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'owner'), name='unique_stock_hold_per_owner')],
+            },
+        ),
+    ]
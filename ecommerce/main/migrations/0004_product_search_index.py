@@ -0,0 +1,33 @@
+from django.db import migrations
+
+
+def create_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE main_product_fts USING fts5("
+        "name, description, category, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    schema_editor.execute(
+        "INSERT INTO main_product_fts (rowid, name, description, category) "
+        "SELECT p.id, p.name, p.description, c.name "
+        "FROM main_product p JOIN main_category c ON c.id = p.category_id"
+    )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS main_product_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0003_stockhold'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
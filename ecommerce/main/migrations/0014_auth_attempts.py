@@ -0,0 +1,21 @@
+# Generated by Django 5.1.15 on 2026-10-18 05:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0013_order_rolled_up'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthAttempts',
+            fields=[
+                ('key', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
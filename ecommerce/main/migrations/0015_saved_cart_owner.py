@@ -0,0 +1,32 @@
+from django.db import migrations, models
+
+
+def copy_saved_carts(apps, schema_editor):
+    LegacySavedCart = apps.get_model('main', 'LegacySavedCart')
+    SavedCart = apps.get_model('main', 'SavedCart')
+    SavedCart.objects.bulk_create(
+        SavedCart(owner=f'user:{cart.user_id}', record=cart.record)
+        for cart in LegacySavedCart.objects.iterator()
+    )
+
+
+class Migration(migrations.Migration):
+    """Key saved carts by cart owner, so anonymous carts are saved too."""
+
+    dependencies = [
+        ('main', '0014_auth_attempts'),
+    ]
+
+    operations = [
+        migrations.RenameModel('SavedCart', 'LegacySavedCart'),
+        migrations.CreateModel(
+            name='SavedCart',
+            fields=[
+                ('owner', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('record', models.TextField()),
+                ('updated_at', models.DateTimeField(auto_now=True, db_index=True)),
+            ],
+        ),
+        migrations.RunPython(copy_saved_carts, migrations.RunPython.noop),
+        migrations.DeleteModel('LegacySavedCart'),
+    ]
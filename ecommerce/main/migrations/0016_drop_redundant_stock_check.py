@@ -0,0 +1,17 @@
+# Generated by Django 5.1.15 on 2026-10-18 05:12
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0015_saved_cart_owner'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='product',
+            name='product_stock_non_negative',
+        ),
+    ]
@@ -1,11 +1,18 @@
+from collections import namedtuple
+from decimal import Decimal
+
 from django.db import models
 from django.contrib.auth.models import User
 
+# One line of an order as shown to the customer, for live and archived orders alike.
+OrderLine = namedtuple('OrderLine', ['product_id', 'name', 'quantity', 'price'])
+
 # -------------------------
 # Category Model
 # -------------------------
 class Category(models.Model):
     name = models.CharField(max_length=100)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -20,10 +27,61 @@ class Product(models.Model):
     image = models.ImageField(upload_to='products/', blank=True, null=True)  # stores inside MEDIA_ROOT/products
     stock = models.PositiveIntegerField(default=0)
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    # Also set by stock updates that bypass save(); drives HTTP Last-Modified.
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Catalog pages: newest first, optionally within one category.
+            models.Index(fields=['category', '-id'], name='product_category_id_idx'),
+            # "In stock" catalog pages only ever need rows with stock left.
+            models.Index(
+                fields=['category', '-id'], condition=models.Q(stock__gt=0), name='product_in_stock_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
+# -------------------------
+# Stock Hold Model
+# -------------------------
+class StockHold(models.Model):
+    """Short-lived reservation of stock for a cart, released on checkout or expiry."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='holds')
+    owner = models.CharField(max_length=64)  # cart owner, see main.cart.cart_owner()
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'owner'], name='unique_stock_hold_per_owner'),
+        ]
+        indexes = [
+            models.Index(fields=['product', 'expires_at'], name='stockhold_product_expiry_idx'),
+            models.Index(fields=['expires_at'], name='stockhold_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} held by {self.owner}"
+
+# -------------------------
+# Saved Cart Model
+# -------------------------
+class SavedCart(models.Model):
+    """
+    Durable copy of a cart, written through by main.cart.
+
+    The cart cache stays the fast path; this row restores the cart after a
+    restart, an eviction, or on another worker with its own cache.
+    """
+    owner = models.CharField(max_length=64, primary_key=True)  # cart owner, see main.cart.cart_owner()
+    record = models.TextField()  # same encoding as the cache entry, see main.cart.encode_record()
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"Cart of {self.owner}"
+
 # -------------------------
 # Order Model
 # -------------------------
@@ -52,10 +110,31 @@ class Order(models.Model):
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHOD_CHOICES, blank=True, null=True)
     payment_status = models.CharField(max_length=20, choices=PAYMENT_STATUS_CHOICES, default='Pending')
     created_at = models.DateTimeField(auto_now_add=True)
+    rolled_up = models.BooleanField(default=False)  # counted in the daily sales rollups, see main.rollups
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='order_user_created_idx'),
+            models.Index(fields=['created_at'], name='order_created_idx'),
+            models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+            models.Index(fields=['payment_status', 'created_at'], name='order_payment_created_idx'),
+            # Fulfilment queue: pending orders by payment state, oldest first.
+            # Delivered orders, the bulk of the table, are left out.
+            models.Index(
+                fields=['payment_status', 'created_at'],
+                condition=models.Q(status='Pending'),
+                name='order_pending_fulfilment_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"Order {self.id} by {self.user.username}"
 
+    @property
+    def lines(self):
+        # Prefetch items__product when listing several orders.
+        return [OrderLine(i.product_id, i.product.name, i.quantity, i.price) for i in self.items.all()]
+
 # -------------------------
 # OrderItem Model
 # -------------------------
@@ -65,9 +144,86 @@ class OrderItem(models.Model):
     quantity = models.PositiveIntegerField()
     price = models.DecimalField(max_digits=10, decimal_places=2)  # price per item at the time of purchase
 
+    class Meta:
+        constraints = [
+            models.CheckConstraint(condition=models.Q(quantity__gt=0), name='orderitem_quantity_positive'),
+        ]
+
     def __str__(self):
         return f"{self.quantity} x {self.product.name}"
 
+# -------------------------
+# Archived Order Model
+# -------------------------
+class ArchivedOrder(models.Model):
+    """
+    A delivered order moved out of Order/OrderItem by `manage.py archive_orders`.
+
+    The order keeps its id, and its lines are stored inline in ``items`` as
+    ``[product_id, product name, quantity, price]`` lists, so reading one
+    archived order is a single row and deleting a product leaves it intact.
+    Only the index the order history needs is kept.
+    """
+    id = models.BigIntegerField(primary_key=True)  # the original Order id
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_orders')
+    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    payment_method = models.CharField(max_length=20, choices=Order.PAYMENT_METHOD_CHOICES, blank=True, null=True)
+    payment_status = models.CharField(max_length=20, choices=Order.PAYMENT_STATUS_CHOICES)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    items = models.JSONField(default=list)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='archivedorder_user_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived order {self.id}"
+
+    @property
+    def lines(self):
+        return [OrderLine(pid, name, qty, Decimal(price)) for pid, name, qty, price in self.items]
+
+# -------------------------
+# Sales Rollup Models
+# -------------------------
+class DailyProductSales(models.Model):
+    """Units and revenue per product per day, maintained by main.rollups."""
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='daily_sales')
+    orders = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'product'], name='unique_daily_product_sales'),
+        ]
+        indexes = [
+            models.Index(fields=['day', 'category'], name='dailysales_day_category_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.day}: {self.units} x {self.product_id}"
+
+class DailyPaymentSales(models.Model):
+    """Order count and revenue per payment method per day."""
+    day = models.DateField()
+    payment_method = models.CharField(max_length=20, blank=True)
+    orders = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'payment_method'], name='unique_daily_payment_sales'),
+        ]
+
+    def __str__(self):
+        return f"{self.day}: {self.payment_method or 'Unknown'} {self.revenue}"
+
 # -------------------------
 # User Profile Model
 # -------------------------
@@ -78,3 +234,47 @@ class Profile(models.Model):
 
     def __str__(self):
         return self.user.username
+
+# -------------------------
+# Background Task Model
+# -------------------------
+class Task(models.Model):
+    """A queued call of a function, run by `manage.py run_tasks` (see tasks.py)."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (FAILED, 'Failed'),
+    )
+
+    name = models.CharField(max_length=200)  # dotted path of the function
+    kwargs = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    run_at = models.DateTimeField()
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Workers claim due tasks oldest first; finished tasks are deleted,
+            # so the table only ever holds the backlog and the failures.
+            models.Index(fields=['run_at', 'id'], condition=models.Q(status='queued'), name='task_due_idx'),
+            models.Index(fields=['status', 'locked_at'], name='task_status_locked_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.status})"
+
+# -------------------------
+# Auth Throttle Model
+# -------------------------
+class AuthAttempts(models.Model):
+    """Attempts counted against one client IP or username in one throttle window (see accounts.py)."""
+    key = models.CharField(max_length=100, primary_key=True)
+    count = models.PositiveIntegerField(default=0)
+    expires_at = models.DateTimeField(db_index=True)
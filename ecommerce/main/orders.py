@@ -0,0 +1,85 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Product, Order, OrderItem
+from . import inventory, rollups, stock_events, tasks
+
+
+class OutOfStock(Exception):
+    def __init__(self, product):
+        self.product = product
+        super().__init__(f"{product.name} is out of stock")
+
+
+class EmptyCart(Exception):
+    pass
+
+
+# -------------------------
+# Checkout Pipeline
+# -------------------------
+def place_order(user, cart, payment_method, owner=None):
+    """
+    Turn a {product_id: quantity} cart into a paid Order in one transaction.
+
+    Stock held by other carts' unexpired holds is not for sale; the holds of
+    ``owner``, the buyer's cart (see main.cart.cart_owner()), count as the
+    buyer's own and are consumed by the order.
+
+    All cart products are locked with a single SELECT ... FOR UPDATE ordered
+    by id, so concurrent checkouts always acquire row locks in the same order
+    and cannot deadlock. Items are inserted with one bulk_create() and stock
+    is decremented with a conditional UPDATE per product, so a row whose
+    stock changed underneath us fails the whole order instead of overselling.
+    """
+    quantities = {int(pid): qty for pid, qty in cart.items() if qty > 0}
+
+    with transaction.atomic():
+        products = list(
+            Product.objects.select_for_update()
+            .filter(id__in=quantities)
+            .order_by('id')
+        )
+        if not products:
+            raise EmptyCart()
+
+        available = inventory.available_quantities(products, owner)
+        for product in products:
+            if available[product.id] < quantities[product.id]:
+                raise OutOfStock(product)
+
+        total_amount = sum(
+            (p.price * quantities[p.id] for p in products), Decimal('0')
+        )
+        order = Order.objects.create(
+            user=user,
+            total_price=total_amount,
+            payment_method=payment_method,
+            payment_status='Paid'
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=p, quantity=quantities[p.id], price=p.price)
+            for p in products
+        ])
+
+        now = timezone.now()
+        for product in products:
+            qty = quantities[product.id]
+            updated = Product.objects.filter(id=product.id, stock__gte=qty).update(
+                stock=F('stock') - qty, updated_at=now
+            )
+            if not updated:
+                raise OutOfStock(product)
+
+        if owner:
+            inventory.release(owner)
+
+        # Rows are locked, so the new stock is known without re-reading it.
+        stock_events.publish_on_commit({p.id: p.stock - quantities[p.id] for p in products})
+        # Follow-up work runs in the task worker, off the buyer's request.
+        tasks.enqueue_on_commit(rollups.record_order, order_id=order.id)
+
+    return order
@@ -0,0 +1,152 @@
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Order, OrderItem, DailyProductSales, DailyPaymentSales
+from .tasks import task
+
+# -------------------------
+# Incremental Refresh
+# -------------------------
+def _increment(model, lookup, amounts, defaults=None):
+    """Add ``amounts`` to the rollup row for ``lookup``, creating it if needed."""
+    changes = {field: F(field) + value for field, value in amounts.items()}
+    if model.objects.filter(**lookup).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **amounts, **(defaults or {}))
+    except IntegrityError:
+        # A concurrent checkout created the row first; add to it instead.
+        model.objects.filter(**lookup).update(**changes)
+
+@task(atomic=True)
+def record_order(order_id):
+    """Add one committed order to the daily rollups (run as a background task)."""
+    # The marker is set in the same transaction as the increments, so an
+    # order already counted, by an earlier run or a backfill, is skipped.
+    if not Order.objects.filter(id=order_id, rolled_up=False).update(rolled_up=True):
+        return
+    order = Order.objects.get(id=order_id)
+    day = timezone.localdate(order.created_at)
+    lines = OrderItem.objects.filter(order_id=order_id).values_list(
+        'product_id', 'product__category_id', 'quantity', 'price',
+    )
+    with transaction.atomic():
+        for product_id, category_id, quantity, price in lines:
+            _increment(
+                DailyProductSales,
+                {'day': day, 'product_id': product_id},
+                {'orders': 1, 'units': quantity, 'revenue': price * quantity},
+                defaults={'category_id': category_id},
+            )
+        _increment(
+            DailyPaymentSales,
+            {'day': day, 'payment_method': order.payment_method or ''},
+            {'orders': 1, 'revenue': order.total_price},
+        )
+
+# -------------------------
+# Backfill
+# -------------------------
+def _day_bounds(start_day, end_day):
+    tz = timezone.get_current_timezone()
+    return (
+        datetime.combine(start_day, time.min, tz),
+        datetime.combine(end_day + timedelta(days=1), time.min, tz),
+    )
+
+def backfill(start_day, end_day, batch_size=2000):
+    """
+    Recompute the rollups for ``start_day``..``end_day`` (inclusive) from orders.
+
+    Existing rollup rows in the range are replaced, so this is safe to rerun.
+    The orders are marked as rolled up, so record_order tasks still queued
+    for them do not count them a second time.
+    Returns the number of (product rows, payment rows) written.
+    """
+    start_at, end_at = _day_bounds(start_day, end_day)
+    lines = (
+        OrderItem.objects
+        .filter(order__created_at__gte=start_at, order__created_at__lt=end_at)
+        .annotate(day=TruncDate('order__created_at'))
+        .values('day', 'product_id', 'product__category_id')
+        .annotate(
+            orders=Count('order_id', distinct=True),
+            units=Sum('quantity'),
+            revenue=Sum(F('quantity') * F('price')),
+        )
+        .order_by()
+    )
+    payments = (
+        Order.objects
+        .filter(created_at__gte=start_at, created_at__lt=end_at)
+        .annotate(day=TruncDate('created_at'))
+        .values('day', 'payment_method')
+        .annotate(orders=Count('id'), revenue=Sum('total_price'))
+        .order_by()
+    )
+
+    with transaction.atomic():
+        # Marking first waits for record_order runs in flight on these orders.
+        Order.objects.filter(created_at__gte=start_at, created_at__lt=end_at, rolled_up=False).update(rolled_up=True)
+        DailyProductSales.objects.filter(day__gte=start_day, day__lte=end_day).delete()
+        DailyPaymentSales.objects.filter(day__gte=start_day, day__lte=end_day).delete()
+        rows = (
+            DailyProductSales(
+                day=row['day'], product_id=row['product_id'], category_id=row['product__category_id'],
+                orders=row['orders'], units=row['units'], revenue=row['revenue'],
+            )
+            for row in lines.iterator(chunk_size=batch_size)
+        )
+        product_rows = 0
+        while batch := list(islice(rows, batch_size)):
+            DailyProductSales.objects.bulk_create(batch)
+            product_rows += len(batch)
+        payment_rows = DailyPaymentSales.objects.bulk_create(
+            [
+                DailyPaymentSales(
+                    day=row['day'], payment_method=row['payment_method'] or '',
+                    orders=row['orders'], revenue=row['revenue'],
+                )
+                for row in payments
+            ],
+            batch_size=batch_size,
+        )
+    return product_rows, len(payment_rows)
+
+# -------------------------
+# Reports
+# -------------------------
+def _money(value):
+    return str(Decimal(value or 0).quantize(Decimal('0.01')))
+
+def sales_summary(start_day, end_day, top=10):
+    """Daily revenue, payment-method and category splits and top products, all from rollups."""
+    products = DailyProductSales.objects.filter(day__gte=start_day, day__lte=end_day)
+    payments = DailyPaymentSales.objects.filter(day__gte=start_day, day__lte=end_day)
+    return {
+        'start': start_day.isoformat(),
+        'end': end_day.isoformat(),
+        'daily': [
+            {'day': row['day'].isoformat(), 'orders': row['orders'], 'revenue': _money(row['revenue'])}
+            for row in payments.values('day').annotate(orders=Sum('orders'), revenue=Sum('revenue')).order_by('day')
+        ],
+        'by_payment_method': [
+            {'payment_method': row['payment_method'] or None, 'orders': row['orders'], 'revenue': _money(row['revenue'])}
+            for row in payments.values('payment_method').annotate(orders=Sum('orders'), revenue=Sum('revenue')).order_by('-revenue')
+        ],
+        'by_category': [
+            {'category': row['category__name'], 'units': row['units'], 'revenue': _money(row['revenue'])}
+            for row in products.values('category__name').annotate(units=Sum('units'), revenue=Sum('revenue')).order_by('-revenue')
+        ],
+        'top_products': [
+            {'product_id': row['product_id'], 'name': row['product__name'], 'units': row['units'], 'revenue': _money(row['revenue'])}
+            for row in products.values('product_id', 'product__name').annotate(units=Sum('units'), revenue=Sum('revenue')).order_by('-revenue')[:top]
+        ],
+    }
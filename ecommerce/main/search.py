@@ -0,0 +1,109 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .catalog import listing_queryset
+
+# -------------------------
+# Product Search Index
+# -------------------------
+# On SQLite, products are indexed in an FTS5 virtual table whose rowid is the
+# product id. Other databases fall back to a plain icontains lookup.
+
+FTS_TABLE = 'main_product_fts'
+
+# bm25() column weights: name, description, category
+RANK_WEIGHTS = (10.0, 1.0, 4.0)
+
+_INDEX_SQL = f"""
+    INSERT INTO {FTS_TABLE} (rowid, name, description, category)
+    SELECT p.id, p.name, p.description, c.name
+    FROM main_product p JOIN main_category c ON c.id = p.category_id
+"""
+
+def is_supported():
+    return connection.vendor == 'sqlite'
+
+def _chunks(ids, size=500):
+    ids = [int(pid) for pid in ids]
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+def index_products(product_ids):
+    """(Re)index the given products from their current rows."""
+    if not is_supported():
+        return
+    with connection.cursor() as cursor:
+        for chunk in _chunks(product_ids):
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", chunk)
+            cursor.execute(f"{_INDEX_SQL} WHERE p.id IN ({placeholders})", chunk)
+
+def remove_products(product_ids):
+    if not is_supported():
+        return
+    with connection.cursor() as cursor:
+        for chunk in _chunks(product_ids):
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", chunk)
+
+def rebuild():
+    """Rebuild the whole index with one set-based INSERT ... SELECT."""
+    if not is_supported():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(_INDEX_SQL)
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+
+# -------------------------
+# Queries
+# -------------------------
+def build_match(query):
+    """
+    Turn free text into an FTS5 MATCH expression.
+
+    Every word must match; the last one is treated as a prefix so results
+    show up while the visitor is still typing. Words are quoted, so FTS5
+    operators in user input are matched literally.
+    """
+    words = re.findall(r'\w+', query.lower())
+    if not words:
+        return None
+    terms = [f'"{w}"' for w in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+def search_ids(query, limit):
+    """Return product ids matching ``query``, best match first."""
+    match = build_match(query)
+    if match is None:
+        return []
+    weights = ', '.join(str(w) for w in RANK_WEIGHTS)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+            f"ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT %s",
+            [match, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+def search(query, limit):
+    """Return up to ``limit`` listing products matching ``query``, ranked."""
+    if not is_supported():
+        words = re.findall(r'\w+', query)
+        if not words:
+            return []
+        condition = Q()
+        for word in words:
+            condition &= (
+                Q(name__icontains=word)
+                | Q(description__icontains=word)
+                | Q(category__name__icontains=word)
+            )
+        return list(listing_queryset().filter(condition).order_by('-id')[:limit])
+
+    ids = search_ids(query, limit)
+    products = listing_queryset().in_bulk(ids)
+    return [products[pid] for pid in ids if pid in products]
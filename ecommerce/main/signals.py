@@ -0,0 +1,68 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Category, Product
+from . import catalog_cache, images, search, stock_events, tasks
+
+# -------------------------
+# Search Index Sync
+# -------------------------
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_products([instance.id])
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    search.remove_products([instance.id])
+
+@receiver(post_save, sender=Category)
+def reindex_category(sender, instance, created, raw=False, **kwargs):
+    if not raw and not created:
+        search.index_products(instance.product_set.values_list('id', flat=True))
+
+# -------------------------
+# Catalog Cache Invalidation
+# -------------------------
+@receiver(pre_save, sender=Product)
+def remember_previous_values(sender, instance, raw=False, **kwargs):
+    # A product moved to another category must also drop out of the old
+    # category's cached pages, and a replaced image needs new derivatives.
+    instance._previous_category_id = None
+    instance._previous_image = None
+    if instance.pk and not raw:
+        previous = Product.objects.filter(pk=instance.pk).values_list('category_id', 'image').first()
+        if previous:
+            instance._previous_category_id, instance._previous_image = previous
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product(sender, instance, **kwargs):
+    category_ids = {instance.category_id, getattr(instance, '_previous_category_id', None)}
+    catalog_cache.bump_product(instance.id, category_ids - {None})
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category(sender, instance, **kwargs):
+    catalog_cache.bump_category(instance.id)
+
+# -------------------------
+# Live Stock Events
+# -------------------------
+@receiver(post_save, sender=Product)
+def publish_stock(sender, instance, raw=False, **kwargs):
+    # Covers stock edited in the admin; checkout publishes its own updates.
+    if not raw:
+        stock_events.publish_on_commit({instance.id: instance.stock})
+
+# -------------------------
+# Image Derivatives
+# -------------------------
+@receiver(post_save, sender=Product)
+def build_product_image_derivatives(sender, instance, raw=False, **kwargs):
+    if raw or not instance.image:
+        return
+    if instance.image.name != getattr(instance, '_previous_image', None):
+        tasks.enqueue_on_commit(
+            images.generate_derivatives, image_name=instance.image.name, product_id=instance.id,
+        )
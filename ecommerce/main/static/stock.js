@@ -0,0 +1,25 @@
+// Keep the stock shown on catalog and product pages current.
+//
+// Subscribes to /events/stock/ for every product on the page. Each "stock"
+// event carries {product_id: stock}; labels marked data-stock-for are
+// rewritten and the data-in-stock-for / data-sold-out-for elements swap.
+(function () {
+    const script = document.currentScript;
+    const labels = document.querySelectorAll('[data-stock-for]');
+    if (!labels.length || !window.EventSource) return;
+
+    const ids = [...new Set([...labels].map(el => el.dataset.stockFor))];
+    const source = new EventSource(`${script.dataset.url}?products=${ids.join(',')}`);
+
+    source.addEventListener('stock', function (e) {
+        for (const [id, stock] of Object.entries(JSON.parse(e.data))) {
+            document.querySelectorAll(`[data-stock-for="${id}"]`).forEach(el => {
+                el.textContent = stock > 0 ? el.dataset.inStock.replace('{n}', stock) : el.dataset.soldOut;
+                el.classList.toggle('text-stock', stock > 0);
+                el.classList.toggle('text-out', stock <= 0);
+            });
+            document.querySelectorAll(`[data-in-stock-for="${id}"]`).forEach(el => { el.hidden = stock <= 0; });
+            document.querySelectorAll(`[data-sold-out-for="${id}"]`).forEach(el => { el.hidden = stock > 0; });
+        }
+    });
+})();
@@ -0,0 +1,55 @@
+import threading
+from functools import partial
+
+from django.db import transaction
+
+# -------------------------
+# In-process Stock Broker
+# -------------------------
+# Checkout and product saves publish the new stock of the products they
+# touched; each open /events/stock/ stream polls the broker once per
+# STOCK_EVENTS_INTERVAL for what changed since the last sequence number it
+# sent. Only the latest value per product is kept, so a burst of sales on
+# one product becomes a single update per interval, and publishing never
+# waits on slow subscribers.
+
+class StockBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._latest = {}  # product_id -> (seq, stock)
+
+    @property
+    def seq(self):
+        with self._lock:
+            return self._seq
+
+    def publish(self, stocks):
+        """Record the new stock of each product in ``{product_id: stock}``."""
+        if not stocks:
+            return
+        with self._lock:
+            self._seq += 1
+            for product_id, stock in stocks.items():
+                self._latest[product_id] = (self._seq, stock)
+
+    def changes_since(self, seq, product_ids):
+        """Return ``(current_seq, {product_id: stock})`` for products changed after ``seq``."""
+        with self._lock:
+            changes = {}
+            for product_id in product_ids:
+                entry = self._latest.get(product_id)
+                if entry and entry[0] > seq:
+                    changes[product_id] = entry[1]
+            return self._seq, changes
+
+    def reset(self):
+        with self._lock:
+            self._seq = 0
+            self._latest.clear()
+
+broker = StockBroker()
+
+def publish_on_commit(stocks):
+    """Publish ``{product_id: stock}`` once the current transaction commits."""
+    transaction.on_commit(partial(broker.publish, dict(stocks)))
@@ -0,0 +1,58 @@
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:  # brotli variants are only written when the package is installed
+    brotli = None
+
+# -------------------------
+# Static Files Storage
+# -------------------------
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.mjs', '.svg', '.json', '.map', '.txt', '.xml', '.html', '.ico')
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Manifest (content-hashed) storage that also precompresses text assets.
+
+    collectstatic writes ``.gz`` and, with brotli installed, ``.br`` files
+    next to every compressible file, for StaticFilesMiddleware to serve to
+    browsers that accept them. Variants that would not be smaller are
+    skipped. Files missing from the manifest, e.g. in tests or before
+    collectstatic has run, are linked under their plain names.
+    """
+
+    manifest_strict = False
+
+    def hashed_name(self, name, content=None, filename=None):
+        try:
+            return super().hashed_name(name, content, filename)
+        except ValueError:
+            if content is not None:
+                raise
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        written = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if not isinstance(processed, Exception) and hashed_name:
+                written.update([name, hashed_name])
+            yield name, hashed_name, processed
+        if not dry_run:
+            for name in sorted(written):
+                if name.endswith(COMPRESSIBLE_EXTENSIONS):
+                    self._compress(name)
+
+    def _compress(self, name):
+        with self.open(name) as f:
+            content = f.read()
+        variants = [('.gz', gzip.compress(content, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append(('.br', brotli.compress(content, quality=11)))
+        for suffix, compressed in variants:
+            if len(compressed) < len(content):
+                if self.exists(name + suffix):
+                    self.delete(name + suffix)
+                self._save(name + suffix, ContentFile(compressed))
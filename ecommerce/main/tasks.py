@@ -0,0 +1,128 @@
+import logging
+import random
+import traceback
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+# -------------------------
+# Defining & Enqueueing Tasks
+# -------------------------
+# A task is any module-level function taking JSON-serialisable keyword
+# arguments. It is stored by dotted path and run by `manage.py run_tasks`,
+# so work enqueued from a request never runs on that request.
+
+def task(atomic=False, max_attempts=None):
+    """
+    Mark a function as a task and set how it is run.
+
+    ``atomic`` tasks run in the same transaction that deletes their queue
+    row, so a database-only task takes effect exactly once even if the
+    worker dies mid-way. Leave it off for slow or non-database work, which
+    must then be safe to repeat.
+    """
+    def decorator(func):
+        func.task_atomic = atomic
+        func.task_max_attempts = max_attempts
+        return func
+    return decorator
+
+def _task_name(func):
+    return f'{func.__module__}.{func.__qualname__}'
+
+def enqueue(func, delay=0, **kwargs):
+    """Queue ``func(**kwargs)`` to run in a worker after ``delay`` seconds."""
+    return Task.objects.create(
+        name=_task_name(func),
+        kwargs=kwargs,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+
+def enqueue_on_commit(func, **kwargs):
+    """Queue the task once the current transaction commits, and not at all if it rolls back."""
+    transaction.on_commit(partial(enqueue, func, **kwargs), robust=True)
+
+# -------------------------
+# Claiming & Running
+# -------------------------
+def backoff(attempts):
+    """Seconds to wait before retry number ``attempts``: doubling, capped, with jitter."""
+    delay = min(settings.TASK_RETRY_BACKOFF * 2 ** (attempts - 1), settings.TASK_RETRY_BACKOFF_MAX)
+    return delay * random.uniform(0.8, 1.2)
+
+def claim(worker, batch_size):
+    """
+    Lock up to ``batch_size`` due tasks for ``worker`` and return them.
+
+    Rows are selected FOR UPDATE SKIP LOCKED, so any number of workers can
+    claim at once without waiting on each other or taking the same task.
+    (SQLite has no row locks; its IMMEDIATE transactions serialise claims.)
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            Task.objects.select_for_update(skip_locked=True)
+            .filter(status=Task.QUEUED, run_at__lte=now)
+            .order_by('run_at', 'id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if ids:
+            Task.objects.filter(id__in=ids).update(
+                status=Task.RUNNING, locked_by=worker, locked_at=now, attempts=F('attempts') + 1,
+            )
+    return list(Task.objects.filter(id__in=ids).order_by('run_at', 'id'))
+
+def run(task_row):
+    """Run one claimed task; delete it on success, reschedule or fail it otherwise."""
+    func = None
+    try:
+        func = import_string(task_row.name)
+        if getattr(func, 'task_atomic', False):
+            with transaction.atomic():
+                func(**task_row.kwargs)
+                Task.objects.filter(id=task_row.id).delete()
+        else:
+            func(**task_row.kwargs)
+            Task.objects.filter(id=task_row.id).delete()
+        return True
+    except Exception:
+        error = traceback.format_exc()
+        max_attempts = getattr(func, 'task_max_attempts', None) or settings.TASK_MAX_ATTEMPTS
+        if task_row.attempts < max_attempts:
+            logger.warning("Task %s #%d failed, retrying:\n%s", task_row.name, task_row.id, error)
+            changes = {'status': Task.QUEUED, 'run_at': timezone.now() + timedelta(seconds=backoff(task_row.attempts))}
+        else:
+            logger.error("Task %s #%d failed for good:\n%s", task_row.name, task_row.id, error)
+            changes = {'status': Task.FAILED}
+        Task.objects.filter(id=task_row.id).update(locked_by='', locked_at=None, last_error=error, **changes)
+        return False
+
+def run_batch(worker, batch_size=None):
+    """Claim and run one batch; return the number of tasks claimed."""
+    claimed = claim(worker, batch_size or settings.TASK_BATCH_SIZE)
+    for task_row in claimed:
+        run(task_row)
+    return len(claimed)
+
+def release_stale():
+    """Requeue tasks whose worker stopped reporting back, e.g. because it was killed."""
+    cutoff = timezone.now() - timedelta(seconds=settings.TASK_LOCK_TIMEOUT)
+    return Task.objects.filter(status=Task.RUNNING, locked_at__lt=cutoff).update(
+        status=Task.QUEUED, locked_by='', locked_at=None,
+    )
+
+def run_pending(worker='inline'):
+    """Run due tasks until none are left; used by tests and `run_tasks --once`."""
+    total = 0
+    while count := run_batch(worker):
+        total += count
+    return total
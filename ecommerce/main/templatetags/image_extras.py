@@ -0,0 +1,43 @@
+# main/templatetags/image_extras.py
+from django import template
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils.html import format_html, format_html_join
+
+from main import images
+
+register = template.Library()
+
+@register.simple_tag
+def product_picture(product, preset, css_style=''):
+    """
+    Render a <picture> with AVIF/WebP/JPEG srcsets for a product image.
+
+    Falls back to a plain <img> of the original upload until derivatives
+    have been generated.
+    """
+    image_name = product.image.name
+    widths = images.derivative_widths(image_name, preset)
+    if not widths:
+        return format_html(
+            '<img src="{}" alt="{}" loading="lazy" style="{}" />',
+            product.image.url, product.name, css_style,
+        )
+
+    sizes = settings.IMAGE_DERIVATIVE_PRESETS[preset]['sizes']
+
+    def srcset(fmt):
+        return ', '.join(
+            f'{default_storage.url(images.derivative_name(image_name, preset, w, fmt))} {w}w'
+            for w in widths
+        )
+
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}" />',
+        ((images.FORMATS[fmt][2], srcset(fmt), sizes) for fmt in images.available_formats() if fmt != 'jpeg'),
+    )
+    fallback = default_storage.url(images.derivative_name(image_name, preset, widths[0], 'jpeg'))
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" alt="{}" loading="lazy" decoding="async" style="{}" /></picture>',
+        sources, fallback, srcset('jpeg'), sizes, product.name, css_style,
+    )
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .cart import write_cart
+
+
+def set_cart(client, cart, user=None):
+    """Store ``cart`` as the test client's cart, for ``user`` or anonymously."""
+    if user is not None:
+        owner = f'user:{user.pk}'
+    else:
+        token = 'test-cart-token-000000'
+        client.cookies[settings.CART_COOKIE_NAME] = token
+        owner = f'anon:{token}'
+    write_cart(owner, cart)
+    return owner
+
+
+class QueryBudgetMixin:
+    """TestCase mixin that checks a view against settings.VIEW_QUERY_BUDGETS."""
+
+    def assertWithinQueryBudget(self, url_name, args=None, method='get', data=None, **kwargs):
+        budget = settings.VIEW_QUERY_BUDGETS[url_name]
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(reverse(url_name, args=args), data, **kwargs)
+        executed = '\n'.join(q['sql'] for q in queries.captured_queries)
+        self.assertLessEqual(
+            len(queries), budget,
+            f"{url_name} ran {len(queries)} queries, budget is {budget}:\n{executed}",
+        )
+        return response
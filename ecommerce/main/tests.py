@@ -1,3 +1,1037 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import json
+import os
+import runpy
+import tempfile
+import threading
+import warnings
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.hashers import make_password
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import F
+from django.contrib.sessions.models import Session
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.templatetags.static import static
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import accounts, archive, db_routing, images, inventory, rollups, search, stock_events, tasks
+from .cart import aread_cart, decode_cart, encode_cart, read_cart, sweep_saved_carts, write_cart
+from .catalog import listing_queryset
+from .middleware import view_stats
+from .models import (
+    ArchivedOrder, AuthAttempts, Category, SavedCart, Product, Order, OrderItem, StockHold, DailyProductSales, DailyPaymentSales, Task,
+)
+from .orders import OutOfStock, place_order
+from .testing import QueryBudgetMixin, set_cart
+
+
+class CartTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Guppy')
+        cls.products = [
+            Product.objects.create(name=f'Fish {i}', price=Decimal('10.00'), description='', stock=5, category=cls.category)
+            for i in range(10)
+        ]
+
+    def fill_cart(self, products):
+        set_cart(self.client, {str(p.id): 2 for p in products})
+
+    def test_cart_query_count_is_constant(self):
+        self.fill_cart(self.products[:2])
+        with self.assertNumQueries(2):  # products, stock holds
+            small = self.client.get(reverse('cart'))
+        self.fill_cart(self.products)
+        with self.assertNumQueries(2):
+            large = self.client.get(reverse('cart'))
+        self.assertEqual(small.context['total_amount'], Decimal('40.00'))
+        self.assertEqual(large.context['total_amount'], Decimal('200.00'))
+
+    def test_ajax_add_to_cart_returns_item(self):
+        product = self.products[0]
+        response = self.client.get(
+            reverse('add_to_cart', args=[product.id]),
+            headers={'x-requested-with': 'XMLHttpRequest'},
+        )
+        data = response.json()
+        self.assertTrue(data['success'])
+        self.assertEqual(data['item']['quantity'], 1)
+        self.assertEqual(data['cart']['total_items'], 1)
+
+    def test_other_carts_holds_reduce_available_stock(self):
+        product = self.products[0]
+        inventory.hold('someone-else', product.id, 4)
+        url = reverse('add_to_cart', args=[product.id])
+        ajax = {'x-requested-with': 'XMLHttpRequest'}
+
+        first = self.client.get(url, headers=ajax).json()
+        second = self.client.get(url, headers=ajax).json()
+
+        self.assertTrue(first['success'])
+        self.assertEqual(first['item']['stock'], 1)
+        self.assertFalse(second['success'])
+        owner = f"anon:{self.client.cookies['cart'].value}"
+        self.assertEqual(StockHold.objects.get(owner=owner).quantity, 1)
+
+    def test_cart_clicks_write_only_stock_holds_and_the_saved_cart(self):
+        product = self.products[0]
+        self.client.get(reverse('add_to_cart', args=[product.id]))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('add_to_cart', args=[product.id]))
+            self.client.get(reverse('decrease_cart', args=[product.id]))
+        writes = [q['sql'] for q in queries.captured_queries if q['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))]
+        self.assertTrue(writes)
+        self.assertTrue(all('main_stockhold' in sql or 'main_savedcart' in sql for sql in writes), writes)
+        self.assertFalse(any('django_session' in q['sql'] for q in queries.captured_queries))
+        self.assertEqual(read_cart(f"anon:{self.client.cookies['cart'].value}"), {str(product.id): 1})
+
+    def test_removing_a_deleted_product_drops_its_line(self):
+        gone, kept = self.products[:2]
+        owner = set_cart(self.client, {str(gone.id): 2, str(kept.id): 1})
+        gone_id = gone.id
+        Product.objects.filter(id=gone_id).delete()
+        ajax = {'x-requested-with': 'XMLHttpRequest'}
+
+        self.assertEqual(self.client.get(reverse('add_to_cart', args=[gone_id]), headers=ajax).status_code, 404)
+        data = self.client.get(reverse('remove_from_cart', args=[gone_id]), headers=ajax).json()
+        self.assertTrue(data['success'])
+        self.assertIsNone(data['item'])
+        self.assertEqual(data['cart'], {'total_items': 1, 'total_amount': 10.0})
+        self.assertEqual(read_cart(owner), {str(kept.id): 1})
+
+        write_cart(owner, {str(gone_id): 2, str(kept.id): 1})
+        self.assertRedirects(self.client.get(reverse('decrease_cart', args=[gone_id])), reverse('cart'))
+        self.assertEqual(read_cart(owner), {str(kept.id): 1})
+
+    def test_adding_never_shrinks_a_line_above_current_stock(self):
+        product = self.products[0]
+        owner = set_cart(self.client, {str(product.id): 5})
+        Product.objects.filter(id=product.id).update(stock=2)
+        ajax = {'x-requested-with': 'XMLHttpRequest'}
+
+        data = self.client.get(reverse('add_to_cart', args=[product.id]), headers=ajax).json()
+        self.assertFalse(data['success'])
+        self.assertEqual(data['item']['quantity'], 5)
+        self.assertEqual(data['cart']['total_items'], 5)
+        self.assertEqual(read_cart(owner), {str(product.id): 5})
+
+        data = self.client.get(reverse('decrease_cart', args=[product.id]), headers=ajax).json()
+        self.assertEqual(data['item']['quantity'], 2)
+        self.assertEqual(read_cart(owner), {str(product.id): 2})
+
+    def test_login_merges_anonymous_cart_and_holds(self):
+        user = User.objects.create_user(username='shopper', password='pass12345')
+        saved, kept = self.products[:2]
+        set_cart(self.client, {str(saved.id): 1, str(kept.id): 1}, user=user)
+        inventory.hold(f'user:{user.pk}', saved.id, 1)
+        anonymous = set_cart(self.client, {str(saved.id): 3})
+        inventory.hold(anonymous, saved.id, 3)
+
+        self.client.post(reverse('login'), {'username': 'shopper', 'password': 'pass12345'})
+
+        self.assertEqual(read_cart(f'user:{user.pk}'), {str(saved.id): 3, str(kept.id): 1})
+        self.assertEqual(read_cart(anonymous), {})
+        hold = StockHold.objects.get(product=saved)
+        self.assertEqual((hold.owner, hold.quantity), (f'user:{user.pk}', 3))
+
+    def test_carts_survive_losing_the_cart_cache(self):
+        user = User.objects.create_user(username='shopper', password='pass12345')
+        product = self.products[0]
+        set_cart(self.client, {}, user=user)
+        self.client.force_login(user)
+        self.client.get(reverse('add_to_cart', args=[product.id]))
+        self.client.get(reverse('add_to_cart', args=[product.id]))
+
+        caches[settings.CART_CACHE_ALIAS].clear()
+
+        self.assertEqual(read_cart(f'user:{user.pk}'), {str(product.id): 2})
+        response = self.client.get(reverse('cart'))
+        self.assertEqual([item['quantity'] for item in response.context['items']], [2])
+
+        self.client.get(reverse('remove_from_cart', args=[product.id]))
+        caches[settings.CART_CACHE_ALIAS].clear()
+        self.assertEqual(read_cart(f'user:{user.pk}'), {})
+
+        self.client.logout()
+        self.client.get(reverse('add_to_cart', args=[product.id]))
+        caches[settings.CART_CACHE_ALIAS].clear()
+        response = self.client.get(reverse('cart'))
+        self.assertEqual([item['quantity'] for item in response.context['items']], [1])
+
+        SavedCart.objects.update(updated_at=timezone.now() - timedelta(seconds=settings.CART_TIMEOUT + 1))
+        self.assertEqual(sweep_saved_carts(), 2)
+
+    async def test_cart_endpoints_run_natively_under_asgi(self):
+        product, other = self.products[:2]
+        ajax = {'x-requested-with': 'XMLHttpRequest'}
+        for p in (product, product, other):
+            response = await self.async_client.get(reverse('add_to_cart', args=[p.id]), headers=ajax)
+        self.assertEqual(response.json()['cart']['total_items'], 3)
+
+        await self.async_client.get(reverse('decrease_cart', args=[product.id]), headers=ajax)
+        data = (await self.async_client.get(reverse('remove_from_cart', args=[other.id]), headers=ajax)).json()
+        self.assertIsNone(data['item'])
+        self.assertEqual(data['cart'], {'total_items': 1, 'total_amount': 10.0})
+
+        owner = f"anon:{self.async_client.cookies['cart'].value}"
+        self.assertEqual(await aread_cart(owner), {str(product.id): 1})
+        hold = await StockHold.objects.aget(owner=owner)
+        self.assertEqual((hold.product_id, hold.quantity), (product.id, 1))
+        detail = await self.async_client.get(reverse('product_detail', args=[product.id]))
+        self.assertContains(detail, product.name)
+
+    def test_cart_encoding_is_compact(self):
+        self.assertEqual(encode_cart({'12': 1, '40': 3, '7': 0}), '12:1,40:3')
+        self.assertEqual(decode_cart('12:1,40:3,bad,9:x'), {'12': 1, '40': 3})
+
+
+class CartApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Guppy')
+        cls.products = [
+            Product.objects.create(name=f'Fish {i}', price=Decimal('10.00'), description='', stock=5, category=category)
+            for i in range(20)
+        ]
+
+    def set_lines(self, lines, **headers):
+        return self.client.post(
+            reverse('cart_lines_api'), json.dumps({'lines': lines}),
+            content_type='application/json', headers=headers,
+        )
+
+    def test_batch_update_returns_only_changed_lines_and_totals(self):
+        set_cart(self.client, {str(p.id): 1 for p in self.products[2:]})
+        self.client.get(reverse('cart_api'))  # prices the saved cart once
+
+        first, second = self.products[:2]
+        with self.assertNumQueries(4):  # products, holds, one hold upsert, saved cart upsert
+            response = self.set_lines([
+                {'product_id': first.id, 'quantity': 3},
+                {'product_id': second.id, 'quantity': 9},
+            ])
+        data = response.json()
+        self.assertEqual([line['quantity'] for line in data['lines']], [3, 5])
+        self.assertEqual(data['errors'][0]['code'], 'insufficient_stock')
+        self.assertEqual((data['total_items'], data['total_amount']), (26, 260.0))
+        self.assertEqual(response['ETag'], f'"cart-{data["version"]}"')
+
+    def test_running_total_follows_price_changes(self):
+        first, second = self.products[:2]
+        self.set_lines([{'product_id': first.id, 'quantity': 2}, {'product_id': second.id, 'quantity': 1}])
+        first.price = Decimal('20.00')
+        first.save()
+        data = self.set_lines([{'product_id': first.id, 'quantity': 3}]).json()
+        self.assertEqual(data['lines'][0]['subtotal'], 60.0)
+        self.assertEqual(data['total_amount'], 70.0)
+        self.assertEqual(self.client.get(reverse('cart_api')).json()['total_amount'], 70.0)
+
+    def test_unchanged_cart_polls_with_304(self):
+        self.set_lines([{'product_id': self.products[0].id, 'quantity': 2}])
+        etag = self.client.get(reverse('cart_api'))['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('cart_api'), headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+        self.set_lines([{'product_id': self.products[0].id, 'quantity': 0}])
+        response = self.client.get(reverse('cart_api'), headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['items'], [])
+
+    def test_stale_if_match_and_bad_bodies_are_rejected(self):
+        product = self.products[0]
+        etag = self.set_lines([{'product_id': product.id, 'quantity': 1}])['ETag']
+        self.set_lines([{'product_id': product.id, 'quantity': 2}])
+        self.assertEqual(self.set_lines([{'product_id': product.id, 'quantity': 3}], **{'If-Match': etag}).status_code, 412)
+        current = self.client.get(reverse('cart_api'))['ETag']
+        self.assertEqual(self.set_lines([{'product_id': product.id, 'quantity': 3}], **{'If-Match': '*'}).status_code, 200)
+        self.assertEqual(self.set_lines([{'product_id': product.id, 'quantity': 4}], **{'If-Match': f'{etag}, {current}'}).status_code, 412)
+        current = self.client.get(reverse('cart_api'))['ETag']
+        self.assertEqual(self.set_lines([{'product_id': product.id, 'quantity': 4}], **{'If-Match': f'{etag}, {current}'}).status_code, 200)
+        self.assertEqual(self.set_lines([{'product_id': product.id, 'quantity': -1}]).status_code, 400)
+        self.assertEqual(self.set_lines([]).status_code, 400)
+
+
+class CheckoutTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='buyer', password='pass12345')
+        category = Category.objects.create(name='Guppy')
+        cls.fish = Product.objects.create(name='Fish', price=Decimal('10.00'), description='', stock=3, category=category)
+        cls.snail = Product.objects.create(name='Snail', price=Decimal('2.50'), description='', stock=10, category=category)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def set_cart(self, cart):
+        set_cart(self.client, cart, user=self.user)
+
+    def test_checkout_creates_order_and_decrements_stock(self):
+        self.set_cart({str(self.fish.id): 2, str(self.snail.id): 4})
+        response = self.client.post(reverse('checkout'), {'payment_method': 'Cash'})
+
+        order = Order.objects.get(user=self.user)
+        self.assertRedirects(response, reverse('checkout_success', args=[order.id]))
+        self.assertEqual(order.total_price, Decimal('30.00'))
+        self.assertEqual(order.items.count(), 2)
+        self.fish.refresh_from_db()
+        self.snail.refresh_from_db()
+        self.assertEqual((self.fish.stock, self.snail.stock), (1, 6))
+        self.assertEqual(read_cart(f'user:{self.user.pk}'), {})
+        self.assertIn('pin_primary', response.cookies)
+
+    def test_checkout_respects_other_carts_holds_and_consumes_its_own(self):
+        owner = f'user:{self.user.pk}'
+        self.set_cart({str(self.fish.id): 2})
+        inventory.hold(owner, self.fish.id, 2)
+        inventory.hold('anon:someone-else', self.fish.id, 2)
+
+        with self.assertRaises(OutOfStock):
+            place_order(self.user, {str(self.fish.id): 2}, 'Cash')
+        order = place_order(self.user, {str(self.fish.id): 1}, 'Cash', owner=owner)
+        self.assertEqual(order.items.get().quantity, 1)
+        self.assertFalse(StockHold.objects.filter(owner=owner).exists())
+        self.assertEqual(StockHold.objects.get().owner, 'anon:someone-else')
+
+    def test_conditional_decrement_refuses_to_oversell(self):
+        # Stand in for a concurrent checkout that sold the stock after this
+        # one's availability check: only the conditional UPDATE stops it.
+        with mock.patch('main.inventory.available_quantities', return_value={self.fish.id: 5}):
+            with self.assertRaises(OutOfStock):
+                place_order(self.user, {str(self.fish.id): 4}, 'Cash')
+        self.assertFalse(Order.objects.exists())
+        self.fish.refresh_from_db()
+        self.assertEqual(self.fish.stock, 3)
+
+    def test_checkout_rejects_when_stock_runs_short(self):
+        self.set_cart({str(self.fish.id): 4, str(self.snail.id): 1})
+        response = self.client.post(reverse('checkout'), {'payment_method': 'Cash'})
+
+        self.assertRedirects(response, reverse('cart'))
+        self.assertFalse(Order.objects.exists())
+        self.snail.refresh_from_db()
+        self.assertEqual(self.snail.stock, 10)
+
+
+class StockEventsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='buyer', password='pass12345')
+        category = Category.objects.create(name='Guppy')
+        cls.fish = Product.objects.create(name='Fish', price=Decimal('10.00'), description='', stock=5, category=category)
+        cls.snail = Product.objects.create(name='Snail', price=Decimal('2.50'), description='', stock=10, category=category)
+
+    def setUp(self):
+        stock_events.broker.reset()
+
+    def test_sales_publish_after_commit_and_coalesce(self):
+        ids = {self.fish.id, self.snail.id}
+        with self.captureOnCommitCallbacks(execute=True):
+            place_order(self.user, {str(self.fish.id): 1}, 'Cash')
+            self.assertEqual(stock_events.broker.changes_since(0, ids), (0, {}))
+        with self.captureOnCommitCallbacks(execute=True):
+            place_order(self.user, {str(self.fish.id): 2, str(self.snail.id): 1}, 'Cash')
+        self.assertEqual(stock_events.broker.changes_since(0, ids), (2, {self.fish.id: 2, self.snail.id: 9}))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.snail.stock = 50
+            self.snail.save()
+        self.assertEqual(stock_events.broker.changes_since(2, ids), (3, {self.snail.id: 50}))
+
+        with self.assertRaises(OutOfStock), self.captureOnCommitCallbacks(execute=True):
+            place_order(self.user, {str(self.fish.id): 99}, 'Cash')
+        self.assertEqual(stock_events.broker.seq, 3)
+
+    @override_settings(STOCK_EVENTS_INTERVAL=0.01, STOCK_EVENTS_STREAM_SECONDS=0.2)
+    async def test_stream_sends_snapshot_then_changes(self):
+        url = f"{reverse('stock_events')}?products={self.fish.id},{self.snail.id}"
+        response = await self.async_client.get(url)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = []
+        async for chunk in response.streaming_content:
+            chunks.append(chunk.decode())
+            if len(chunks) == 2:
+                stock_events.broker.publish({self.fish.id: 4, 999: 1})
+                stock_events.broker.publish({self.fish.id: 3})
+        self.assertEqual(chunks[0], f'event: stock\ndata: {{"{self.fish.id}":5,"{self.snail.id}":10}}\n\n')
+        self.assertEqual(chunks[1], 'retry: 3000\n\n')
+        self.assertEqual(chunks[2:], [f'event: stock\ndata: {{"{self.fish.id}":3}}\n\n'])
+
+
+    async def test_bad_subscriptions_are_rejected(self):
+        for query in ('', '?products=', '?products=1,x', '?products=' + ','.join(map(str, range(101)))):
+            response = await self.async_client.get(reverse('stock_events') + query)
+            self.assertEqual(response.status_code, 400)
+
+    def test_wsgi_asks_browsers_not_to_reconnect(self):
+        self.assertEqual(self.client.get(f"{reverse('stock_events')}?products=1").status_code, 204)
+
+
+class CatalogTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.fish = Category.objects.create(name='Fish')
+        cls.plants = Category.objects.create(name='Plants')
+        for i in range(5):
+            Product.objects.create(name=f'Fish {i}', price=Decimal('1.00'), description='word ' * 50, stock=1, category=cls.fish)
+            Product.objects.create(name=f'Plant {i}', price=Decimal('1.00'), description='', stock=1, category=cls.plants)
+
+    def test_keyset_pages_cover_catalog_once(self):
+        seen = []
+        after = None
+        with self.settings(CATALOG_PAGE_SIZE=4):
+            while True:
+                response = self.client.get(reverse('product_list'), {'after': after} if after else {})
+                seen += [p.id for p in response.context['products']]
+                after = response.context['next_cursor']
+                if after is None:
+                    break
+        self.assertEqual(seen, sorted(Product.objects.values_list('id', flat=True), reverse=True))
+
+    def test_category_filter(self):
+        response = self.client.get(reverse('home'), {'category': self.plants.id})
+        self.assertEqual({p.category_id for p in response.context['products']}, {self.plants.id})
+        self.assertContains(response, 'Plant 0')
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.fish = Category.objects.create(name='Livebearers')
+        cls.guppy = Product.objects.create(name='Yellow Guppy', price=Decimal('5.00'), description='Hardy fish', stock=1, category=cls.fish)
+        cls.molly = Product.objects.create(name='Black Molly', price=Decimal('5.00'), description='Peaceful, pairs well with guppy', stock=1, category=cls.fish)
+
+    def search(self, q):
+        return [p.id for p in self.client.get(reverse('search'), {'q': q}).context['products']]
+
+    def test_ranks_name_matches_first_and_supports_prefixes(self):
+        self.assertEqual(self.search('guppy'), [self.guppy.id, self.molly.id])
+        self.assertEqual(self.search('mol'), [self.molly.id])
+        self.assertEqual(set(self.search('livebear')), {self.guppy.id, self.molly.id})
+
+    def test_index_follows_product_and_category_changes(self):
+        self.guppy.name = 'Endler'
+        self.guppy.save()
+        self.assertEqual(self.search('endler'), [self.guppy.id])
+        self.fish.name = 'Tetras'
+        self.fish.save()
+        self.assertEqual(set(self.search('tetras')), {self.guppy.id, self.molly.id})
+        self.molly.delete()
+        self.assertEqual(self.search('tetras'), [self.guppy.id])
+
+
+class CatalogCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Fish')
+        cls.product = Product.objects.create(name='Guppy', price=Decimal('5.00'), description='Hardy', stock=4, category=cls.category)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cached_listing_keeps_stock_fresh(self):
+        self.client.get(reverse('home'))
+        Product.objects.filter(id=self.product.id).update(stock=1)
+        with self.assertNumQueries(1):  # live stock only
+            response = self.client.get(reverse('home'))
+        self.assertEqual(response.context['products'][0].stock, 1)
+
+    def test_product_save_invalidates_cached_pages(self):
+        self.client.get(reverse('product_detail', args=[self.product.id]))
+        self.client.get(reverse('home'))
+        self.product.name = 'Endler'
+        self.product.description = 'Tiny'
+        self.product.save()
+        self.assertContains(self.client.get(reverse('home')), 'Endler')
+        self.assertContains(self.client.get(reverse('product_detail', args=[self.product.id])), 'Tiny')
+
+    def test_unchanged_pages_revalidate_with_304(self):
+        for url in (reverse('home'), reverse('product_detail', args=[self.product.id])):
+            etag = self.client.get(url)['ETag']
+            self.assertEqual(self.client.get(url, headers={'if-none-match': etag}).status_code, 304)
+
+            Product.objects.filter(id=self.product.id).update(stock=F('stock') - 1, updated_at=timezone.now())
+            response = self.client.get(url, headers={'if-none-match': etag})
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+
+
+class StaticFilesTests(SimpleTestCase):
+    def test_collected_assets_are_hashed_precompressed_and_immutable(self):
+        with tempfile.TemporaryDirectory() as root, override_settings(STATIC_ROOT=root):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            url = static('style.css')
+            self.assertRegex(url, r'/static/style\.[0-9a-f]{12}\.css$')
+            self.assertTrue(os.path.exists(os.path.join(root, url.rsplit('/', 1)[1] + '.gz')))
+
+            response = self.client.get(url, headers={'accept-encoding': 'gzip, deflate'})
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(response['Content-Type'], 'text/css')
+            self.assertIn('immutable', response['Cache-Control'])
+            self.assertIn('Accept-Encoding', response['Vary'])
+            self.assertIn(b'body', gzip.decompress(b''.join(response.streaming_content)))
+            response.close()
+
+            response = self.client.get('/static/style.css')
+            self.assertNotIn('Content-Encoding', response)
+            response.close()
+            response = self.client.get('/static/style.css', headers={'if-none-match': response['ETag']})
+            self.assertEqual(response.status_code, 304)
+
+
+class OrderHistoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='regular', password='pass12345')
+        category = Category.objects.create(name='Fish')
+        products = [
+            Product.objects.create(name=f'Fish {i}', price=Decimal('1.00'), description='', stock=100, category=category)
+            for i in range(3)
+        ]
+        for _ in range(15):
+            order = Order.objects.create(user=cls.user, total_price=Decimal('3.00'))
+            OrderItem.objects.bulk_create([OrderItem(order=order, product=p, quantity=1, price=p.price) for p in products])
+
+    def test_history_is_paginated_with_fixed_query_count(self):
+        self.client.force_login(self.user)
+        # user, live and archived counts, orders, items, products; the session is read from cache
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('profile'))
+        self.assertEqual(len(response.context['orders']), 10)
+        self.assertContains(response, 'Fish 2', count=10)
+        self.assertEqual(len(self.client.get(reverse('profile'), {'page': 2}).context['orders']), 5)
+
+
+class OrderArchiveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser(username='keeper', password='pass12345')
+        category = Category.objects.create(name='Fish')
+        cls.guppy = Product.objects.create(name='Guppy', price=Decimal('2.50'), description='', stock=100, category=category)
+        cls.snail = Product.objects.create(name='Snail', price=Decimal('1.00'), description='', stock=100, category=category)
+        old = timezone.now() - timedelta(days=500)
+        for age, status in ((3, 'Delivered'), (2, 'Delivered'), (1, 'Delivered'), (0, 'Pending')):
+            order = Order.objects.create(user=cls.user, total_price=Decimal('6.00'), status=status, payment_method='Cash')
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=cls.guppy, quantity=2, price=Decimal('2.50')),
+                OrderItem(order=order, product=cls.snail, quantity=1, price=Decimal('1.00')),
+            ])
+            Order.objects.filter(id=order.id).update(created_at=old - timedelta(days=age))
+        cls.recent = Order.objects.create(user=cls.user, total_price=Decimal('2.50'), status='Delivered')
+        OrderItem.objects.create(order=cls.recent, product=cls.guppy, quantity=1, price=Decimal('2.50'))
+
+    def test_archives_old_delivered_orders_in_batches(self):
+        out = StringIO()
+        call_command('archive_orders', dry_run=True, stdout=out)
+        self.assertIn('3 delivered order(s)', out.getvalue())
+        call_command('archive_orders', batch_size=2, stdout=out)
+
+        self.assertEqual(ArchivedOrder.objects.count(), 3)
+        self.assertEqual(set(Order.objects.values_list('status', flat=True)), {'Pending', 'Delivered'})
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(OrderItem.objects.count(), 3)
+
+        guppy_id = self.guppy.id
+        self.guppy.delete()
+        archived = ArchivedOrder.objects.earliest('created_at')
+        self.assertEqual(archived.items, [[guppy_id, 'Guppy', 2, '2.50'], [self.snail.id, 'Snail', 1, '1.00']])
+        self.assertEqual(archived.lines[0].price, Decimal('2.50'))
+
+    @override_settings(ORDER_HISTORY_PAGE_SIZE=3)
+    def test_history_admin_and_exports_read_archived_orders(self):
+        call_command('archive_orders', stdout=StringIO())
+        self.client.force_login(self.user)
+
+        pages = [self.client.get(reverse('profile'), {'page': n}).context['orders'] for n in (1, 2)]
+        orders = [order.id for page in pages for order in page]
+        self.assertEqual(len(orders), 5)
+        self.assertEqual(orders[:2], [self.recent.id, self.recent.id - 1])
+        self.assertEqual(orders[2:], sorted(ArchivedOrder.objects.values_list('id', flat=True), reverse=True))
+        self.assertContains(self.client.get(reverse('profile'), {'page': 2}), 'Snail', count=2)
+
+        archived = ArchivedOrder.objects.first()
+        self.assertContains(self.client.get(reverse('admin:main_archivedorder_changelist')), 'keeper')
+        self.assertContains(self.client.get(reverse('admin:main_archivedorder_change', args=[archived.id])), '2 x Guppy')
+
+        rows = list(csv.reader(StringIO(self.client.get(reverse('export_orders')).getvalue().decode())))
+        self.assertEqual(len(rows), 1 + 3 * 2 + 2 + 1)
+        self.assertEqual(rows[1][0], str(archived.id))
+        self.assertEqual(rows[1][-4:], ['Guppy', '2', '2.50', '5.00'])
+
+    @override_settings(ORDER_HISTORY_PAGE_SIZE=2)
+    def test_history_merges_live_and_archived_orders_by_date(self):
+        call_command('archive_orders', stdout=StringIO())
+        pending = Order.objects.get(status='Pending')
+        Order.objects.filter(id=pending.id).update(created_at=ArchivedOrder.objects.earliest('created_at').created_at - timedelta(days=1))
+        self.client.force_login(self.user)
+
+        pages = [self.client.get(reverse('profile'), {'page': n}).context['orders'] for n in (1, 2, 3)]
+        orders = [order.id for page in pages for order in page]
+        archived = sorted(ArchivedOrder.objects.values_list('id', flat=True), reverse=True)
+        self.assertEqual(orders, [self.recent.id, *archived, pending.id])
+
+    def test_backfill_refuses_archived_days(self):
+        call_command('archive_orders', stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('backfill_rollups', start='2000-01-01', stdout=StringIO())
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='budget', password='pass12345', is_staff=True)
+        category = Category.objects.create(name='Fish')
+        cls.products = [
+            Product.objects.create(name=f'Fish {i}', price=Decimal('1.00'), description='', stock=100, category=category)
+            for i in range(30)
+        ]
+        for _ in range(12):
+            order = Order.objects.create(user=cls.user, total_price=Decimal('30.00'))
+            OrderItem.objects.bulk_create([OrderItem(order=order, product=p, quantity=1, price=p.price) for p in cls.products])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        set_cart(self.client, {str(p.id): 1 for p in self.products}, user=self.user)
+
+    def test_views_stay_within_query_budgets(self):
+        self.assertWithinQueryBudget('home')
+        self.assertWithinQueryBudget('product_detail', args=[self.products[0].id])
+        self.assertWithinQueryBudget('cart')
+        self.assertWithinQueryBudget('checkout')
+        self.assertWithinQueryBudget('profile')
+
+    def test_server_timing_and_stats_endpoint(self):
+        view_stats.reset()
+        response = self.client.get(reverse('home'))
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertEqual(self.client.get(reverse('stats')).json()['views']['home']['requests'], 1)
+        self.assertIn('view_requests_total{view="home"} 1', self.client.get(reverse('stats'), {'format': 'prometheus'}).content.decode())
+
+    async def test_queries_are_counted_under_asgi(self):
+        view_stats.reset()
+        response = await self.async_client.get(reverse('product_detail', args=[self.products[0].id]))
+        self.assertRegex(response['Server-Timing'], r'desc="[1-9]\d* queries"')
+        self.assertGreater(view_stats.snapshot()['product_detail']['queries'], 0)
+
+
+class BenchmarkCommandTests(TestCase):
+    def test_seed_and_bench_round_trip(self):
+        out = StringIO()
+        call_command('seed_store', categories=2, products=20, users=3, orders=10, stdout=out)
+        self.assertEqual(Order.objects.count(), 10)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'baseline.json')
+            call_command('bench_storefront', iterations=2, cart_size=2, output=path, stdout=out)
+            call_command('bench_storefront', iterations=1, cart_size=2, compare=path, stdout=out)
+            with open(path) as f:
+                flows = json.load(f)['flows']
+        self.assertEqual(flows['add_to_cart']['requests'], 4)
+        self.assertIn('vs baseline', out.getvalue())
+
+
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = self.settings(MEDIA_ROOT=media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        cache.clear()
+
+    def test_upload_generates_derivatives_used_by_card(self):
+        buffer = BytesIO()
+        Image.new('RGB', (1600, 1200), 'orange').save(buffer, 'JPEG')
+        category = Category.objects.create(name='Fish')
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(
+                name='Guppy', price=Decimal('5.00'), description='', stock=1, category=category,
+                image=SimpleUploadedFile('guppy.jpg', buffer.getvalue()),
+            )
+        self.assertFalse(default_storage.exists(images.derivative_name(product.image.name, 'card', 320, 'webp')))
+        # Cache the card and detail fragments with the full-size fallback first.
+        self.assertNotContains(self.client.get(reverse('home')), '<picture')
+        self.client.get(reverse('product_detail', args=[product.id]))
+        self.assertEqual(tasks.run_pending(), 1)
+
+        thumb = images.derivative_name(product.image.name, 'card', 320, 'webp')
+        self.assertTrue(default_storage.exists(thumb))
+        with default_storage.open(thumb) as f:
+            self.assertEqual(Image.open(f).size, (320, 320))
+        self.assertContains(self.client.get(reverse('home')), f'{default_storage.url(thumb)} 320w')
+        self.assertContains(self.client.get(reverse('product_detail', args=[product.id])), '<picture')
+
+
+class CatalogImportExportTests(TestCase):
+    def test_import_upserts_and_export_round_trips(self):
+        fish = Category.objects.create(name='Fish')
+        existing = Product.objects.create(name='Old name', price=Decimal('1.00'), description='', stock=1, category=fish)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            source = os.path.join(tmp, 'catalog.jsonl')
+            with open(source, 'w') as f:
+                f.write(json.dumps({'id': existing.id, 'name': 'Guppy', 'price': '5.50', 'stock': 7, 'category': 'Fish'}) + '\n')
+                f.write(json.dumps({'name': 'Java Moss', 'price': '2', 'stock': 3, 'category': 'Plants'}) + '\n')
+                f.write(json.dumps({'name': 'No price', 'category': 'Plants'}) + '\n')
+            call_command('import_catalog', source, batch_size=2, stdout=StringIO(), stderr=StringIO())
+
+            existing.refresh_from_db()
+            self.assertEqual((existing.name, existing.price, existing.stock), ('Guppy', Decimal('5.50'), 7))
+            moss = Product.objects.get(name='Java Moss')
+            self.assertEqual(moss.category.name, 'Plants')
+            self.assertEqual(Product.objects.count(), 2)
+            self.assertEqual([p.id for p in search.search('moss', 10)], [moss.id])
+
+            target = os.path.join(tmp, 'export.csv')
+            call_command('export_catalog', target, chunk_size=1, stderr=StringIO())
+            with open(target) as f:
+                exported = list(csv.DictReader(f))
+        self.assertEqual([r['name'] for r in exported], ['Guppy', 'Java Moss'])
+        self.assertEqual(exported[1]['category'], 'Plants')
+
+    def test_import_skips_negative_rows_and_inserts_after_explicit_ids(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            source = os.path.join(tmp, 'catalog.jsonl')
+            with open(source, 'w') as f:
+                f.write(json.dumps({'id': 500, 'name': 'Guppy', 'price': '5', 'stock': 1, 'category': 'Fish'}) + '\n')
+                f.write(json.dumps({'name': 'Refund', 'price': '-1', 'stock': 1, 'category': 'Fish'}) + '\n')
+                f.write(json.dumps({'name': 'Oversold', 'price': '1', 'stock': -2, 'category': 'Fish'}) + '\n')
+                f.write(json.dumps({'name': 'Snail', 'price': '1', 'stock': 4, 'category': 'Fish'}) + '\n')
+                f.write(json.dumps({'id': 500, 'name': 'Fancy Guppy', 'price': '6', 'stock': 2, 'category': 'Fish'}) + '\n')
+            stderr = StringIO()
+            call_command('import_catalog', source, batch_size=10, stdout=StringIO(), stderr=stderr)
+
+        self.assertIn('Record 2: skipped (price and stock must not be negative)', stderr.getvalue())
+        self.assertIn('Record 3: skipped', stderr.getvalue())
+        self.assertEqual(sorted(Product.objects.values_list('name', flat=True)), ['Fancy Guppy', 'Snail'])
+        self.assertGreater(Product.objects.create(
+            name='Moss', price=Decimal('2'), description='', stock=1, category=Category.objects.get(name='Fish'),
+        ).id, 500)
+
+
+    def test_export_to_an_unwritable_path_is_a_command_error(self):
+        with self.assertRaises(CommandError):
+            call_command('export_catalog', os.path.join(tempfile.gettempdir(), 'missing-dir', 'out.csv'), stderr=StringIO())
+
+
+class OrderExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='finance', password='pass12345', is_staff=True)
+        category = Category.objects.create(name='Fish')
+        product = Product.objects.create(name='Guppy', price=Decimal('2.50'), description='', stock=10, category=category)
+        for day in (1, 2, 3):
+            order = Order.objects.create(user=cls.staff, total_price=Decimal('5.00'), payment_method='Cash')
+            Order.objects.filter(id=order.id).update(created_at=datetime(2026, 3, day, 12, tzinfo=dt_timezone.utc))
+            OrderItem.objects.create(order=order, product=product, quantity=2, price=product.price)
+
+    def test_staff_only(self):
+        response = self.client.get(reverse('export_orders'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_streams_csv_filtered_by_date(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('export_orders'), {'start': '2026-03-02', 'end': '2026-03-02'})
+        self.assertTrue(response.streaming)
+        rows = list(csv.DictReader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual((rows[0]['payment_method'], rows[0]['line_total']), ('Cash', '5.00'))
+
+    async def test_streams_without_buffering_under_asgi(self):
+        await self.async_client.aforce_login(self.staff)
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')  # "must consume synchronous iterators"
+            response = await self.async_client.get(reverse('export_orders'), {'format': 'jsonl'})
+            self.assertTrue(response.is_async)
+            lines = [chunk async for chunk in response.streaming_content]
+        self.assertEqual(len(b''.join(lines).decode().splitlines()), 3)
+
+    def test_jsonl_and_bad_dates(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('export_orders'), {'format': 'jsonl'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(json.loads(lines[0])['product_name'], 'Guppy')
+        self.assertEqual(self.client.get(reverse('export_orders'), {'start': 'March'}).status_code, 400)
+
+
+class SalesRollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='analyst', password='pass12345', is_staff=True)
+        cls.category = Category.objects.create(name='Fish')
+        cls.product = Product.objects.create(name='Guppy', price=Decimal('2.50'), description='', stock=100, category=cls.category)
+
+    def checkout(self, quantity):
+        with self.captureOnCommitCallbacks(execute=True):
+            order = place_order(self.user, {str(self.product.id): quantity}, 'Cash')
+        tasks.run_pending()
+        return order
+
+    def test_checkout_updates_rollups_incrementally_and_backfill_agrees(self):
+        self.checkout(2)
+        self.checkout(3)
+        incremental = DailyProductSales.objects.get(product=self.product)
+        self.assertEqual((incremental.orders, incremental.units, incremental.revenue), (2, 5, Decimal('12.50')))
+        self.assertEqual(DailyPaymentSales.objects.get(payment_method='Cash').orders, 2)
+
+        today = timezone.localdate()
+        rollups.backfill(today, today)
+        rebuilt = DailyProductSales.objects.get(product=self.product)
+        self.assertEqual((rebuilt.orders, rebuilt.units, rebuilt.revenue), (2, 5, Decimal('12.50')))
+
+    def test_backfill_with_queued_tasks_counts_orders_once(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            place_order(self.user, {str(self.product.id): 2}, 'Cash')
+        today = timezone.localdate()
+        rollups.backfill(today, today)
+        tasks.run_pending()
+        rollups.record_order(order_id=Order.objects.get().id)
+
+        row = DailyProductSales.objects.get(product=self.product)
+        self.assertEqual((row.orders, row.units), (1, 2))
+        self.assertEqual(DailyPaymentSales.objects.get(payment_method='Cash').orders, 1)
+
+    def test_sales_report(self):
+        self.checkout(4)
+        self.client.force_login(self.user)
+        with self.assertNumQueries(5):  # user and four rollup queries
+            report = self.client.get(reverse('sales_report')).json()
+        self.assertEqual(report['by_category'], [{'category': 'Fish', 'units': 4, 'revenue': '10.00'}])
+        self.assertEqual(report['by_payment_method'][0]['payment_method'], 'Cash')
+
+
+@tasks.task(atomic=True, max_attempts=2)
+def create_category_then_fail(name):
+    Category.objects.create(name=name)
+    raise RuntimeError("downstream service unavailable")
+
+
+class TaskQueueTests(TestCase):
+    def test_checkout_only_enqueues_follow_up_work(self):
+        user = User.objects.create_user(username='buyer', password='pass12345')
+        product = Product.objects.create(
+            name='Guppy', price=Decimal('2.50'), description='', stock=10,
+            category=Category.objects.create(name='Fish'),
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            order = place_order(user, {str(product.id): 1}, 'Cash')
+
+        task = Task.objects.get()
+        self.assertEqual((task.name, task.kwargs), ('main.rollups.record_order', {'order_id': order.id}))
+        self.assertFalse(DailyProductSales.objects.exists())
+        self.assertEqual(tasks.run_pending(), 1)
+        self.assertFalse(Task.objects.exists())
+        self.assertTrue(DailyProductSales.objects.exists())
+
+    def test_failures_roll_back_and_retry_with_backoff_then_fail(self):
+        tasks.enqueue(create_category_then_fail, name='Snails')
+        with self.assertLogs('main.tasks', 'WARNING'):
+            self.assertEqual(tasks.run_batch('test'), 1)
+
+        task = Task.objects.get()
+        self.assertEqual((task.status, task.attempts), (Task.QUEUED, 1))
+        self.assertGreater(task.run_at, timezone.now())
+        self.assertIn('downstream service unavailable', task.last_error)
+        self.assertFalse(Category.objects.filter(name='Snails').exists())
+        self.assertEqual(tasks.run_batch('test'), 0)  # not due yet
+
+        Task.objects.update(run_at=timezone.now())
+        with self.assertLogs('main.tasks', 'ERROR'):
+            tasks.run_batch('test')
+        self.assertEqual(Task.objects.get().status, Task.FAILED)
+
+    def test_claim_takes_due_tasks_once_and_stale_ones_are_released(self):
+        for i in range(3):
+            tasks.enqueue(rollups.record_order, order_id=i)
+        claimed = tasks.claim('worker-1', 2)
+        self.assertEqual([t.status for t in claimed], [Task.RUNNING, Task.RUNNING])
+        self.assertEqual(len(tasks.claim('worker-2', 5)), 1)
+        self.assertEqual(tasks.claim('worker-3', 5), [])
+
+        Task.objects.update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(tasks.release_stale(), 3)
+
+
+class AccountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def login(self, password, username='shopper'):
+        return self.client.post(reverse('login'), {'username': username, 'password': password})
+
+    def test_register_then_login_rehashes_outdated_passwords(self):
+        response = self.client.post(reverse('register'), {'username': 'shopper', 'email': 'S@Example.COM', 'password': 'pass12345'})
+        self.assertRedirects(response, reverse('login'))
+        user = User.objects.get(username='shopper')
+        self.assertEqual(user.email, 'S@example.com')
+        self.assertTrue(user.check_password('pass12345'))
+        response = self.client.post(reverse('register'), {'username': 'shopper', 'email': '', 'password': 'other'})
+        self.assertContains(response, 'username is taken', status_code=400)
+
+        User.objects.filter(id=user.id).update(password=make_password('pass12345', hasher='pbkdf2_sha1'))
+        self.assertRedirects(self.login('pass12345'), reverse('home'), fetch_redirect_response=False)
+        self.assertEqual(int(self.client.session['_auth_user_id']), user.id)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$'))
+
+    @override_settings(AUTH_ATTEMPTS_PER_USERNAME=2, AUTH_ATTEMPTS_PER_IP=4)
+    def test_attempts_are_throttled_before_hashing(self):
+        User.objects.create_user(username='shopper', password='pass12345')
+        self.assertContains(self.login('wrong'), 'Invalid credentials')
+        self.assertContains(self.login('wrong'), 'Invalid credentials')
+        with mock.patch('main.accounts._verify') as verify:
+            self.assertEqual(self.login('pass12345').status_code, 429)
+        verify.assert_not_called()
+
+        # Other usernames from the same client run into the per-IP limit.
+        self.assertContains(self.login('wrong', username='someone'), 'Invalid credentials')
+        self.assertEqual(self.login('wrong', username='someone-else').status_code, 429)
+
+    @override_settings(AUTH_ATTEMPTS_PER_IP=3)
+    async def test_parallel_attempts_cannot_exceed_the_limit(self):
+        request = RequestFactory().post(reverse('login'))
+        throttled = await asyncio.gather(*(accounts.athrottle_attempt(request) for _ in range(10)))
+        self.assertEqual(throttled.count(False), 3)
+        self.assertEqual((await AuthAttempts.objects.aget(key=accounts._ip_key(request)[0])).count, 10)
+
+    @override_settings(AUTH_ATTEMPTS_PER_IP=2)
+    def test_register_probing_for_usernames_is_throttled(self):
+        User.objects.create_user(username='shopper', password='pass12345')
+        for _ in range(2):
+            response = self.client.post(reverse('register'), {'username': 'shopper', 'password': 'x'})
+            self.assertContains(response, 'username is taken', status_code=400)
+        response = self.client.post(reverse('register'), {'username': 'shopper', 'password': 'x'})
+        self.assertEqual(response.status_code, 429)
+
+    def test_full_hashing_queue_answers_503(self):
+        User.objects.create_user(username='shopper', password='pass12345')
+        with mock.patch('main.accounts._slots', threading.BoundedSemaphore(1)) as slots:
+            slots.acquire()
+            response = self.login('pass12345')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '5')
+        self.assertNotIn('_auth_user_id', self.client.session)
+
+
+class AdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin_user = User.objects.create_superuser(username='admin', password='pass12345')
+        category = Category.objects.create(name='Fish')
+        product = Product.objects.create(name='Guppy', price=Decimal('1.00'), description='', stock=1, category=category)
+        for i in range(20):
+            user = User.objects.create_user(username=f'customer{i}')
+            order = Order.objects.create(user=user, total_price=Decimal('1.00'))
+            OrderItem.objects.create(order=order, product=product, quantity=1, price=product.price)
+
+    def setUp(self):
+        self.client.force_login(self.admin_user)
+
+    def test_changelists_do_not_query_per_row(self):
+        for name in ('main_order_changelist', 'main_orderitem_changelist', 'main_product_changelist'):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(reverse(f'admin:{name}')).status_code, 200)
+            self.assertLess(len(queries), 12, name)
+
+    def test_estimated_count_for_large_tables(self):
+        url = reverse('admin:main_order_changelist')
+        Order.objects.filter(id__in=Order.objects.order_by('-id').values('id')[:5]).delete()
+        with self.settings(ADMIN_EXACT_COUNT_LIMIT=5):
+            # No planner statistics yet: counted exactly.
+            self.assertEqual(self.client.get(url).context['cl'].result_count, 15)
+            archive.refresh_statistics()
+            Order.objects.filter(id=Order.objects.earliest('id').id).delete()
+            # Estimated from the statistics, which lag until the next refresh.
+            self.assertEqual(self.client.get(url).context['cl'].result_count, 15)
+
+    def test_mark_shipped_is_a_single_update(self):
+        ids = list(Order.objects.values_list('id', flat=True)[:5])
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('admin:main_order_changelist'), {
+                'action': 'mark_shipped', '_selected_action': ids,
+            })
+        self.assertEqual(Order.objects.filter(status='Shipped').count(), 5)
+        self.assertEqual(sum(q['sql'].startswith('UPDATE "main_order"') for q in queries.captured_queries), 1)
+
+
+class QueryPlanTests(TestCase):
+    """Check with EXPLAIN that the hot queries are served by their indexes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='planner')
+        cls.category = Category.objects.create(name='Fish')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+
+    def test_catalog_pages_use_category_indexes(self):
+        page = listing_queryset().filter(category_id=self.category.id, id__lt=100).order_by('-id')[:25]
+        self.assertUsesIndex(page, 'product_category_id_idx')
+        in_stock = listing_queryset().filter(category_id=self.category.id, stock__gt=0).order_by('-id')[:25]
+        self.assertUsesIndex(in_stock, 'product_in_stock_idx')
+
+    def test_order_queries_use_order_indexes(self):
+        history = Order.objects.filter(user=self.user).order_by('-created_at')[:10]
+        self.assertUsesIndex(history, 'order_user_created_idx')
+        queue = Order.objects.filter(status='Pending', payment_status='Paid').order_by('created_at')[:50]
+        self.assertUsesIndex(queue, 'order_pending_fulfilment_idx')
+
+
+class SettingsTests(SimpleTestCase):
+    def load_settings(self, **env):
+        path = os.path.join(settings.BASE_DIR, 'ecommerce', 'settings.py')
+        with mock.patch.dict(os.environ, env):
+            return runpy.run_path(path)
+
+    def test_database_engine_comes_from_the_environment(self):
+        self.assertEqual(self.load_settings(DJANGO_DB_ENGINE='sqlite')['DATABASES']['default']['ENGINE'], 'django.db.backends.sqlite3')
+        postgres = self.load_settings(DJANGO_DB_ENGINE='postgresql', DJANGO_DB_POOL_SIZE='4')['DATABASES']['default']
+        self.assertEqual(postgres['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual(postgres['OPTIONS']['pool']['max_size'], 4)
+        with self.assertRaisesMessage(ImproperlyConfigured, "Unknown DJANGO_DB_ENGINE 'postgres'"):
+            self.load_settings(DJANGO_DB_ENGINE='postgres')
+
+
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        self.router = db_routing.PrimaryReplicaRouter()
+        self.router.replica = db_routing.REPLICA
+
+    def test_catalog_reads_use_replica_until_pinned_or_written(self):
+        with db_routing.request_scope():
+            self.assertEqual(self.router.db_for_read(Product), 'replica')
+            self.assertIsNone(self.router.db_for_read(Session))
+            with db_routing.use_primary():
+                self.assertEqual(self.router.db_for_read(Order), 'default')
+            self.assertEqual(self.router.db_for_read(Order), 'replica')
+
+            self.assertEqual(self.router.db_for_write(Order), 'default')
+            self.assertTrue(db_routing.has_written())
+            self.assertEqual(self.router.db_for_read(Product), 'default')
+
+        with db_routing.request_scope(pinned=True):
+            self.assertEqual(self.router.db_for_read(Product), 'default')
+
+    def test_replica_is_never_migrated(self):
+        self.assertFalse(self.router.allow_migrate('replica', 'main'))
+        self.assertTrue(self.router.allow_migrate('default', 'main'))
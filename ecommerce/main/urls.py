@@ -8,6 +8,9 @@ urlpatterns = [
     path('decrease-cart/<int:product_id>/', views.decrease_cart, name='decrease_cart'),
     path('remove-from-cart/<int:product_id>/', views.remove_from_cart, name='remove_from_cart'),
     path('cart/', views.cart, name='cart'),
+    path('api/v1/cart/', views.cart_api, name='cart_api'),
+    path('api/v1/cart/lines/', views.cart_lines_api, name='cart_lines_api'),
+    path('events/stock/', views.stock_events_stream, name='stock_events'),
     path('checkout/', views.checkout, name='checkout'),
 
     path('register/', views.register, name='register'),
@@ -16,5 +19,9 @@ urlpatterns = [
     
     path('checkout/success/<int:order_id>/', views.checkout_success, name='checkout_success'),
     path('profile/', views.profile, name='profile'),
-    path('products/', views.home, name='product_list'),
+    path('products/', views.product_list, name='product_list'),
+    path('reports/orders/', views.export_orders, name='export_orders'),
+    path('reports/sales/', views.sales_report, name='sales_report'),
+    path('stats/', views.stats, name='stats'),
+    path('search/', views.search_products, name='search'),
 ]
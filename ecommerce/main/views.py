@@ -1,191 +1,332 @@
+import asyncio
+import hashlib
+import json
+import time
+from datetime import date, timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.paginator import Paginator
+from django.db import IntegrityError
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.contrib.auth import authenticate, login as auth_login, logout as auth_logout
-from .models import Product, Order, OrderItem
+from django.contrib.auth import alogin as auth_alogin, logout as auth_logout
+from .models import Product, Order
+from . import catalog_cache
+from . import search
+from .cart import (
+    MAX_LINES_PER_UPDATE, get_cart, aget_cart, save_cart, cart_owner, cart_state, acart_state,
+    build_cart, abuild_cart, aset_quantities, atotals, remember_total, merge_anonymous_cart,
+    serialize_cart, serialize_item, serialize_totals,
+)
+from . import accounts, db_routing, rollups, stock_events
+from .orders import place_order, OutOfStock, EmptyCart
+from .archive import OrderHistory
+from .middleware import view_stats
+from .exports import ORDER_LINE_COLUMNS, aiter_chunks, encode_rows, order_lines, parse_date_range
 from django.contrib.auth.models import User
+from django.utils import timezone
 from django.contrib import messages
-from django.db import transaction
-from django.http import JsonResponse
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import (
+    Http404, HttpResponse, HttpResponseBadRequest, HttpResponseNotModified, JsonResponse, StreamingHttpResponse,
+)
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, parse_etags
+from django.views.decorators.http import require_GET, require_POST
 
 # -------------------------
 # Home & Product Views
 # -------------------------
+def _int_param(request, name):
+    try:
+        return int(request.GET[name])
+    except (KeyError, ValueError):
+        return None
+
+def _render_conditional(request, template, context, parts, modified):
+    """
+    Render a page with validators, or answer 304 if the browser's copy is current.
+
+    The ETag hashes everything the page is built from: ``parts`` (ids,
+    cache versions and updated_at values already loaded to render it), the
+    URL, the viewer and any pending flash message, so checking it costs no
+    queries. ``modified`` is the newest updated_at shown, for Last-Modified.
+    """
+    viewer = request.user.pk if request.user.is_authenticated else None
+    key = repr((request.get_full_path(), viewer, request.COOKIES.get('messages'), parts))
+    etag = '"{}"'.format(hashlib.md5(key.encode(), usedforsecurity=False).hexdigest())
+    last_modified = modified.timestamp() if modified else None
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = render(request, template, context)
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'private, no-cache'
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+def _render_catalog(request):
+    category_id = _int_param(request, 'category')
+    in_stock = request.GET.get('in_stock') == '1'
+    products, next_cursor = catalog_cache.cached_catalog_page(
+        category_id, _int_param(request, 'after'), in_stock=in_stock,
+    )
+    categories = catalog_cache.cached_categories()
+    parts = (
+        next_cursor,
+        [(p.id, p.cache_version, p.updated_at) for p in products],
+        [(c.id, c.updated_at) for c in categories],
+    )
+    modified = max((obj.updated_at for obj in [*products, *categories]), default=None)
+    return _render_conditional(request, 'home.html', {
+        'products': products,
+        'next_cursor': next_cursor,
+        'categories': categories,
+        'current_category': category_id,
+        'in_stock': in_stock,
+    }, parts, modified)
+
 def home(request):
-    products = Product.objects.all()
-    return render(request, 'home.html', {'products': products})
+    return _render_catalog(request)
 
-def product_detail(request, product_id):
-    product = get_object_or_404(Product, id=product_id)
-    return render(request, 'product.html', {'product': product})
+async def product_detail(request, product_id):
+    request.user = await request.auser()  # resolved here so rendering does no sync queries
+    product = await catalog_cache.acached_product(product_id)
+    if product is None:
+        raise Http404("No Product matches the given query.")
+    return _render_conditional(
+        request, 'product.html', {'product': product},
+        (product.id, product.cache_version, product.updated_at), product.updated_at,
+    )
 
 def product_list(request):
-    products = Product.objects.all()
-    return render(request, 'products.html', {'products': products})
+    return _render_catalog(request)
+
+def search_products(request):
+    query = request.GET.get('q', '').strip()
+    products = search.search(query, settings.SEARCH_RESULT_LIMIT) if query else []
+    catalog_cache.attach_card_versions(products)
+    return render(request, 'home.html', {'products': products, 'query': query})
 
 # -------------------------
 # Cart Views
 # -------------------------
-def _get_cart_data(request):
-    cart = request.session.get('cart', {})
-    items = []
-    total_amount = 0
-    total_items = 0
+# The AJAX cart endpoints are async: under ASGI a click waiting on the
+# cache or the database holds no worker thread. Each click changes one
+# line through aset_quantities() and answers with just that line and the
+# running totals, so its cost does not grow with the cart.
 
-    for pid, quantity in cart.items():
-        try:
-            product = Product.objects.get(id=pid)
-            subtotal = product.price * quantity
-            total_amount += subtotal
-            total_items += quantity
-            items.append({
-                'product_id': product.id,
-                'name': product.name,
-                'price': float(product.price),
-                'quantity': quantity,
-                'subtotal': float(subtotal),
-                'stock': product.stock
-            })
-        except Product.DoesNotExist:
-            continue
-    
-    return {
-        'items': items,
-        'total_amount': float(total_amount),
-        'total_items': total_items
-    }
+def _is_ajax(request):
+    return request.headers.get('x-requested-with') == 'XMLHttpRequest'
 
-def add_to_cart(request, product_id):
-    product = get_object_or_404(Product, id=product_id)
-    cart = request.session.get('cart', {})
-    
-    current_qty = cart.get(str(product_id), 0)
-    success = False
-    message = ""
-
-    if product.stock > current_qty:
-        cart[str(product_id)] = current_qty + 1
-        request.session['cart'] = cart
-        success = True
-    else:
-        message = f"Insufficient stock. Only {product.stock} available."
-        if not request.headers.get('x-requested-with') == 'XMLHttpRequest':
+async def _change_line(request, product_id, quantity):
+    state = await acart_state(request)
+    previous = state['cart'].get(str(product_id), 0)
+    if quantity is None:
+        quantity = previous + 1
+    lines, errors = await aset_quantities(request, {product_id: quantity})
+    if errors and errors[0]['code'] == 'unknown':
+        if quantity > previous:
+            raise Http404("No Product matches the given query.")
+        # A deleted product has no line left, which is all a decrease or
+        # remove asked for.
+        errors = []
+    message = errors[0]['message'] if errors else ""
+    if not _is_ajax(request):
+        if message:
             messages.error(request, message)
+        return redirect('cart')
 
-    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-        cart_data = _get_cart_data(request)
-        return JsonResponse({
-            'success': success,
-            'message': message,
-            'cart': cart_data,
-            'item': next((i for i in cart_data['items'] if i['product_id'] == product_id), None)
-        })
-        
-    return redirect('cart')
-
-def decrease_cart(request, product_id):
-    cart = request.session.get('cart', {})
-    if str(product_id) in cart:
-        if cart[str(product_id)] > 1:
-            cart[str(product_id)] -= 1
-        else:
-            del cart[str(product_id)]
-        request.session['cart'] = cart
-
-    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-        cart_data = _get_cart_data(request)
-        return JsonResponse({
-            'success': True,
-            'cart': cart_data,
-            'item': next((i for i in cart_data['items'] if i['product_id'] == product_id), None)
-        })
-        
-    return redirect('cart')
-
-def remove_from_cart(request, product_id):
-    cart = request.session.get('cart', {})
-    if str(product_id) in cart:
-        del cart[str(product_id)]
-        request.session['cart'] = cart
-
-    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-        return JsonResponse({
-            'success': True,
-            'cart': _get_cart_data(request)
-        })
-        
-    return redirect('cart')
+    line = lines[0] if lines else None
+    return JsonResponse({
+        'success': not errors,
+        'message': message,
+        'version': state['version'],
+        'item': serialize_item(line) if line and line['quantity'] else None,
+        'cart': serialize_totals(await atotals(state)),
+    })
+
+async def add_to_cart(request, product_id):
+    return await _change_line(request, product_id, None)
+
+async def decrease_cart(request, product_id):
+    cart = await aget_cart(request)
+    return await _change_line(request, product_id, max(cart.get(str(product_id), 0) - 1, 0))
+
+async def remove_from_cart(request, product_id):
+    return await _change_line(request, product_id, 0)
 
 def cart(request):
-    data = _get_cart_data(request)
-    # Convert internal data back to template format if needed, 
-    # but let's just use the direct items for standard render
-    cart_session = request.session.get('cart', {})
-    items = []
-    total_amount = 0
-    for pid, quantity in cart_session.items():
-        product = get_object_or_404(Product, id=pid)
-        subtotal = product.price * quantity
-        total_amount += subtotal
-        items.append({'product': product, 'quantity': quantity, 'subtotal': subtotal})
-    
-    return render(request, 'cart.html', {'items': items, 'total_amount': total_amount})
+    data = build_cart(get_cart(request), cart_owner(request))
+    remember_total(cart_state(request), data)
+    return render(request, 'cart.html', {'items': data['items'], 'total_amount': data['total_amount']})
+
+# -------------------------
+# Cart API
+# -------------------------
+# Version 1 of the JSON cart API. Every response carries the cart version
+# as its ETag: polling with If-None-Match answers 304 from the cart store
+# alone, and updates sent with If-Match fail with 412 if the cart changed
+# in another tab since it was read.
+
+def _cart_etag(state):
+    return f'"cart-{state["version"]}"'
+
+def _etag_matches(header, etag):
+    """Whether an If-Match/If-None-Match value, ``*`` or a list of ETags, matches ``etag``."""
+    etags = parse_etags(header)
+    return '*' in etags or etag in etags
+
+@require_GET
+async def cart_api(request):
+    state = await acart_state(request)
+    etag = _cart_etag(state)
+    if _etag_matches(request.headers.get('If-None-Match', ''), etag):
+        response = HttpResponseNotModified()
+    else:
+        data = await abuild_cart(state['cart'], state['owner'])
+        remember_total(state, data)
+        response = JsonResponse({'version': state['version'], **serialize_cart(data)})
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+def _parse_lines(body):
+    """Return {product_id: quantity} from a ``{"lines": [...]}`` body, or raise ValueError."""
+    lines = json.loads(body)['lines']
+    if not isinstance(lines, list) or not 0 < len(lines) <= MAX_LINES_PER_UPDATE:
+        raise ValueError
+    quantities = {}
+    for line in lines:
+        product_id, quantity = line['product_id'], line['quantity']
+        if type(product_id) is not int or type(quantity) is not int or quantity < 0:
+            raise ValueError
+        quantities[product_id] = quantity
+    return quantities
+
+@require_POST
+async def cart_lines_api(request):
+    """Set the quantities of up to MAX_LINES_PER_UPDATE lines in one request."""
+    try:
+        quantities = _parse_lines(request.body)
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse(
+            {'error': f'Expected {{"lines": [{{"product_id": int, "quantity": int >= 0}}, ...]}} '
+                      f'with 1 to {MAX_LINES_PER_UPDATE} lines.'},
+            status=400,
+        )
+
+    state = await acart_state(request)
+    if 'If-Match' in request.headers and not _etag_matches(request.headers['If-Match'], _cart_etag(state)):
+        response = JsonResponse({'error': 'The cart changed since it was read.', 'version': state['version']}, status=412)
+        response['ETag'] = _cart_etag(state)
+        return response
+
+    lines, errors = await aset_quantities(request, quantities)
+    response = JsonResponse({
+        'version': state['version'],
+        'lines': [serialize_item(line) for line in lines],
+        'errors': errors,
+        **serialize_totals(await atotals(state)),
+    })
+    response['ETag'] = _cart_etag(state)
+    return response
+
+# -------------------------
+# Live Stock Events
+# -------------------------
+# Catalog and product pages subscribe with EventSource to the stock of the
+# products they show, so a sale elsewhere updates the page in place. Each
+# stream lasts STOCK_EVENTS_STREAM_SECONDS and is then reconnected by the
+# browser, so proxies never see an endless request.
+
+MAX_STOCK_EVENT_PRODUCTS = 100
+
+def _sse(event=None, data=None, comment=None):
+    lines = []
+    if comment is not None:
+        lines.append(f': {comment}')
+    if event is not None:
+        lines.append(f'event: {event}')
+    if data is not None:
+        lines.append(f'data: {json.dumps(data, separators=(",", ":"))}')
+    return '\n'.join(lines) + '\n\n'
+
+async def _stock_stream(product_ids):
+    broker = stock_events.broker
+    # Start every stream, reconnects included, from the database so sales
+    # published in other worker processes are picked up at least once per
+    # stream. Take the sequence first so nothing published during the query
+    # is skipped.
+    last_seq = broker.seq
+    stocks = {
+        pid: stock async for pid, stock in Product.objects.filter(id__in=product_ids).values_list('id', 'stock')
+    }
+    yield _sse('stock', stocks)
+    yield f'retry: {settings.STOCK_EVENTS_RETRY_MS}\n\n'
+
+    deadline = time.monotonic() + settings.STOCK_EVENTS_STREAM_SECONDS
+    last_sent = time.monotonic()
+    while time.monotonic() < deadline:
+        await asyncio.sleep(settings.STOCK_EVENTS_INTERVAL)
+        last_seq, changes = broker.changes_since(last_seq, product_ids)
+        if changes:
+            yield _sse('stock', changes)
+        elif time.monotonic() - last_sent >= settings.STOCK_EVENTS_KEEPALIVE:
+            yield _sse(comment='keep-alive')
+        else:
+            continue
+        last_sent = time.monotonic()
+
+@require_GET
+async def stock_events_stream(request):
+    """Stream ``stock`` events, ``{product_id: stock}``, for the products in ``?products=1,2``."""
+    if not isinstance(request, ASGIRequest):
+        # A WSGI worker would buffer the whole stream. 204 tells EventSource
+        # to stop reconnecting; the page keeps the stock it was rendered with.
+        return HttpResponse(status=204)
+    try:
+        product_ids = {int(pid) for pid in request.GET.get('products', '').split(',')}
+    except ValueError:
+        return HttpResponseBadRequest("products must be a comma-separated list of ids.")
+    if not 0 < len(product_ids) <= MAX_STOCK_EVENT_PRODUCTS:
+        return HttpResponseBadRequest(f"Subscribe to between 1 and {MAX_STOCK_EVENT_PRODUCTS} products.")
+
+    response = StreamingHttpResponse(_stock_stream(product_ids), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx: pass events through as they are written
+    return response
 
 # -------------------------
 # Checkout & Success Views
 # -------------------------
 @login_required
+@db_routing.use_primary()
 def checkout(request):
-    cart = request.session.get('cart', {})
+    cart = get_cart(request)
     if not cart:
         return redirect('home')
 
-    items = []
-    total_amount = 0
-    for pid, quantity in cart.items():
-        product = get_object_or_404(Product, id=pid)
-        subtotal = product.price * quantity
-        total_amount += subtotal
-        items.append({'product': product, 'quantity': quantity, 'subtotal': subtotal})
-
     if request.method == 'POST':
         payment_method = request.POST.get('payment_method')
-        
-        with transaction.atomic():
-            # Final stock check
-            for item in items:
-                product = Product.objects.select_for_update().get(id=item['product'].id)
-                if product.stock < item['quantity']:
-                    messages.error(request, f"Sorry, {product.name} just went out of stock.")
-                    return redirect('cart')
-
-            # Create Order
-            order = Order.objects.create(
-                user=request.user,
-                total_price=total_amount,
-                payment_method=payment_method,
-                payment_status='Paid'
-            )
-
-            # Create OrderItems and deduct stock
-            for item in items:
-                p = item['product']
-                qty = item['quantity']
-                
-                OrderItem.objects.create(
-                    order=order,
-                    product=p,
-                    quantity=qty,
-                    price=p.price
-                )
-                
-                # Update stock
-                p.stock -= qty
-                p.save()
-
-        request.session['cart'] = {}  # clear cart
+        try:
+            order = place_order(request.user, cart, payment_method, owner=cart_owner(request))
+        except OutOfStock as e:
+            messages.error(request, f"Sorry, {e.product.name} just went out of stock.")
+            return redirect('cart')
+        except EmptyCart:
+            save_cart(request, {})
+            return redirect('home')
+
+        save_cart(request, {})  # clear cart; place_order() released its holds
         return redirect('checkout_success', order_id=order.id)
 
-    return render(request, 'checkout.html', {'items': items, 'total_amount': total_amount})
+    data = build_cart(cart)
+    return render(request, 'checkout.html', {'items': data['items'], 'total_amount': data['total_amount']})
 
 @login_required
 def checkout_success(request, order_id):
@@ -194,30 +335,62 @@ def checkout_success(request, order_id):
 
 @login_required
 def profile(request):
-    orders = Order.objects.filter(user=request.user).order_by('-created_at')
-    return render(request, 'profile.html', {'orders': orders})
+    orders = OrderHistory(request.user)
+    page = Paginator(orders, settings.ORDER_HISTORY_PAGE_SIZE).get_page(request.GET.get('page'))
+    return render(request, 'profile.html', {'orders': page, 'page': page})
 
 # -------------------------
 # Authentication Views
 # -------------------------
-def register(request):
+# Login and registration are async: the password hash runs on the bounded
+# pool in main.accounts, so a burst of sign-ins cannot take every worker
+# thread from browsing. Clients over their attempt limit are refused before
+# anything is hashed.
+
+THROTTLED = "Too many attempts. Please wait a few minutes and try again."
+BUSY = "We are busy right now. Please try again in a moment."
+
+def _auth_error(request, template, error, status):
+    response = render(request, template, {'error': error}, status=status)
+    if status == 503:
+        response['Retry-After'] = '5'
+    return response
+
+async def register(request):
+    request.user = await request.auser()  # resolved here so rendering does no sync queries
     if request.method == 'POST':
-        User.objects.create_user(
-            username=request.POST['username'],
-            password=request.POST['password'],
-            email=request.POST.get('email', '')
-        )
+        username = request.POST.get('username', '')
+        if not username or not request.POST.get('password'):
+            return _auth_error(request, 'register.html', "Username and password are required.", 400)
+        # Counted before the username check, so probing for taken names is throttled too.
+        if await accounts.athrottle_attempt(request):
+            return _auth_error(request, 'register.html', THROTTLED, 429)
+        if await User.objects.filter(username=username).aexists():
+            return _auth_error(request, 'register.html', "That username is taken.", 400)
+        try:
+            await accounts.acreate_user(username, request.POST.get('email', ''), request.POST['password'])
+        except accounts.HashingBusy:
+            return _auth_error(request, 'register.html', BUSY, 503)
+        except IntegrityError:
+            return _auth_error(request, 'register.html', "That username is taken.", 400)
         return redirect('login')
     return render(request, 'register.html')
 
-def login_view(request):
+async def login_view(request):
+    request.user = await request.auser()
     if request.method == 'POST':
-        user = authenticate(
-            username=request.POST['username'],
-            password=request.POST['password']
-        )
+        username = request.POST.get('username', '')
+        if await accounts.athrottle_attempt(request, username):
+            return _auth_error(request, 'login.html', THROTTLED, 429)
+        try:
+            user = await accounts.aauthenticate(request, username, request.POST.get('password', ''))
+        except accounts.HashingBusy:
+            return _auth_error(request, 'login.html', BUSY, 503)
         if user:
-            auth_login(request, user)
+            await accounts.aclear_failures(username)
+            anonymous_owner = cart_owner(request)
+            await auth_alogin(request, user)
+            await sync_to_async(merge_anonymous_cart)(request, anonymous_owner)
             return redirect('home')
         else:
             return render(request, 'login.html', {'error': 'Invalid credentials'})
@@ -227,3 +400,44 @@ def login_view(request):
 def logout_view(request):
     auth_logout(request)
     return redirect('home')
+
+# -------------------------
+# Reporting Views
+# -------------------------
+@staff_member_required
+def export_orders(request):
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in ('csv', 'jsonl'):
+        return HttpResponseBadRequest("format must be csv or jsonl")
+    try:
+        start_at, end_at = parse_date_range(request.GET.get('start'), request.GET.get('end'))
+    except ValueError:
+        return HttpResponseBadRequest("start and end must be YYYY-MM-DD dates")
+
+    content_type = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    chunks = encode_rows(order_lines(start_at, end_at), fmt, ORDER_LINE_COLUMNS)
+    if isinstance(request, ASGIRequest):
+        # The ASGI handler buffers sync iterators whole; hand it an async one.
+        chunks = aiter_chunks(chunks)
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="orders.{fmt}"'
+    return response
+
+@staff_member_required
+def sales_report(request):
+    today = timezone.localdate()
+    try:
+        start = date.fromisoformat(request.GET['start']) if 'start' in request.GET else today - timedelta(days=29)
+        end = date.fromisoformat(request.GET['end']) if 'end' in request.GET else today
+    except ValueError:
+        return HttpResponseBadRequest("start and end must be YYYY-MM-DD dates")
+    return JsonResponse(rollups.sales_summary(start, end))
+
+# -------------------------
+# Instrumentation Views
+# -------------------------
+@staff_member_required
+def stats(request):
+    if request.GET.get('format') == 'prometheus':
+        return HttpResponse(view_stats.as_prometheus(), content_type='text/plain; version=0.0.4')
+    return JsonResponse({'views': view_stats.snapshot()})